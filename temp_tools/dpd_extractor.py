@@ -1,35 +1,169 @@
+import argparse
+import itertools
+import os
 import sqlite3
-import pandas as pd
-import json
-import json_maker
+import sys
+import tempfile
+import time
+
+from typing import Dict, Iterator, List, Tuple
+
+# lexicon_compiler puts text_to_anki/ on sys.path for lexicon_store.
+from lexicon_compiler import (BASE_OUTPUTS, PACKS_DIR, build,
+                              derived_outputs, file_digest, fingerprint,
+                              peak_memory_mb, read_manifest, write_derived,
+                              write_manifest)
+from lexicon_store import (COMPILED_NAME, FORWARD_COMPILED_NAME,
+                           write_compiled_stream)
 
 ### NOTE: Requires dpd.db tarball file from digital pali dictionary release
+###
+### Streams dpd_headwords straight into the compiled lexicon format:
+### lexicon.bin (form -> lemmas, read by the app) and forward.bin
+### (lemma -> forms). Rows are staged in a temporary SQLite database and
+### sorted there, so memory does not grow with the size of the DPD.
+### The build manifest it leaves lets later runs go through
+### lexicon_compiler's incremental build, which patches only the
+### headwords whose inflections changed.
+
+HEADWORDS_QUERY = "SELECT lemma_1, inflections FROM dpd_headwords"
+
+
+def iter_headwords(
+        db_path: str,
+        batch_size: int = 5000
+) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Yield (lemma, inflections) from dpd.db, `batch_size` rows at a time.
+
+    :param db_path: str: Path to dpd.db.
+    :param batch_size: int: Rows fetched per round trip.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(HEADWORDS_QUERY)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for lemma, inflections in rows:
+                forms = [form.strip()
+                         for form in (inflections or '').split(',')]
+                yield lemma, [form for form in forms if form]
+    finally:
+        conn.close()
+
+
+def _stage(staging: sqlite3.Connection, db_path: str, batch_size: int) -> int:
+    """Copy every (lemma, form) pair into the staging table."""
+    staging.execute("CREATE TABLE pairs (lemma TEXT, form TEXT)")
+    batch: List[Tuple[str, str]] = []
+    count = 0
+    for lemma, forms in iter_headwords(db_path, batch_size):
+        batch.extend((lemma, form) for form in forms)
+        if len(batch) >= batch_size:
+            staging.executemany("INSERT INTO pairs VALUES (?, ?)", batch)
+            count += len(batch)
+            batch.clear()
+    staging.executemany("INSERT INTO pairs VALUES (?, ?)", batch)
+    count += len(batch)
+
+    # Ids are positions in (binary collated, i.e. UTF-8 byte) sort order,
+    # which is what the compiled format binary-searches on.
+    for column in ("lemma", "form"):
+        staging.execute(f"CREATE TABLE {column}s "
+                        f"(id INTEGER PRIMARY KEY, {column} TEXT UNIQUE)")
+        staging.execute(f"INSERT INTO {column}s ({column}) SELECT DISTINCT "
+                        f"{column} FROM pairs ORDER BY {column}")
+    staging.commit()
+    return count
+
+
+def _write_map(staging: sqlite3.Connection, key: str, value: str,
+               path: str) -> None:
+    """Compile the `key` -> `value`s map from the staging tables."""
+    links = staging.execute(
+        f"SELECT DISTINCT p.{key}, v.id - 1 FROM pairs p "
+        f"JOIN {value}s v ON v.{value} = p.{value} "
+        f"ORDER BY p.{key}, v.id")
+    values = (row[0] for row in staging.execute(
+        f"SELECT {value} FROM {value}s ORDER BY id"))
+    write_compiled_stream(links, values, path)
+
+
+def _fingerprints(staging: sqlite3.Connection) -> Dict[str, str]:
+    """Per-headword fingerprints, as lexicon_compiler computes them."""
+    rows = staging.execute(
+        "SELECT lemma, form FROM pairs ORDER BY lemma, rowid")
+    return {lemma: fingerprint(form for _, form in group)
+            for lemma, group in itertools.groupby(rows, lambda row: row[0])}
+
+
+def extract(db_path: str, output_dir: str, batch_size: int = 5000) -> int:
+    """
+    Write lexicon.bin and forward.bin for the DPD into `output_dir`, with
+    the build manifest for later incremental runs.
+
+    :return: int: Number of (lemma, form) pairs read.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    derived = derived_outputs(output_dir)
+    handle, staging_path = tempfile.mkstemp(suffix='.db', dir=output_dir)
+    os.close(handle)
+    staging = sqlite3.connect(staging_path)
+    try:
+        staging.execute("PRAGMA journal_mode = OFF")
+        staging.execute("PRAGMA synchronous = OFF")
+        count = _stage(staging, db_path, batch_size)
+        _write_map(staging, 'form', 'lemma',
+                   os.path.join(output_dir, COMPILED_NAME))
+        _write_map(staging, 'lemma', 'form',
+                   os.path.join(output_dir, FORWARD_COMPILED_NAME))
+        files = {os.path.basename(db_path): {
+            'sha256': file_digest(db_path),
+            'lemmas': _fingerprints(staging)}}
+    finally:
+        staging.close()
+        os.remove(staging_path)
+    write_derived(output_dir, derived)
+    write_manifest(output_dir, 'dpd', files,
+                   list(BASE_OUTPUTS['dpd']) + derived)
+    return count
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compile the Pali lexicon from a DPD release.")
+    parser.add_argument('db', nargs='?', default='dpd.db',
+                        help='path to dpd.db (default: ./dpd.db)')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--lang', default='pali',
+                        help='language pack to write into (default: pali)')
+    target.add_argument('-o', '--output', help='output directory')
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help='rows fetched and inserted per batch')
+    parser.add_argument('--full', action='store_true',
+                        help='ignore the build manifest and rebuild all')
+    args = parser.parse_args(argv)
+
+    output_dir = args.output or os.path.join(PACKS_DIR, args.lang, 'lex')
+    started = time.perf_counter()
+    if args.full or read_manifest(output_dir, 'dpd') is None:
+        count = extract(args.db, output_dir, args.batch_size)
+        summary = f"wrote {output_dir}: {count} lemma/form pairs"
+    else:
+        written, summary = build('dpd', args.db, output_dir)
+        summary = (f"updated {output_dir}: {summary}" if written
+                   else f"{output_dir} is up to date")
+    elapsed = time.perf_counter() - started
 
-# Connect to the SQLite database
-conn = sqlite3.connect('dpd.db')
+    peak = peak_memory_mb()
+    print(f"{summary} in {elapsed:.1f}s, peak memory "
+          + (f"{peak:.0f} MB" if peak >= 0 else "n/a"))
+    return 0
 
-# Function to query the database and return a DataFrame
-def query_db(query):
-    return pd.read_sql_query(query, conn)
 
 if __name__ == "__main__":
-    query = "SELECT lemma_1, inflections FROM dpd_headwords;"
-    df_forward = query_db(query)
-
-    # Process inflections from a comma-separated string to a list of strings
-    df_forward['inflections'] = df_forward['inflections'].apply(
-        lambda x: x.split(',') if isinstance(x, str) else x)
-
-    # Convert DataFrame to a dictionary mapping lemmas to lists of inflections
-    forward_dict = df_forward.set_index('lemma_1')['inflections'].to_dict()
-
-    forward_mapping_filename = 'forward_map.json'
-    # Save to JSON with nice formatting using the json module
-    with open(forward_mapping_filename, 'w', encoding='utf-8') as f:
-        json.dump(forward_dict, f, ensure_ascii=False, indent=4)
-
-    backward_mapping_filename = 'backward_map.json'
-    json_maker.reverse_json_writer(
-        read=forward_mapping_filename,
-        write=backward_mapping_filename
-    )
\ No newline at end of file
+    sys.exit(main())
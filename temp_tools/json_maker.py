@@ -1,73 +1,93 @@
-from typing import Dict, List, Set
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List
 import xml.etree.ElementTree as Et
 import json
 import os
 
 
-def lemma_forms_parser(directory: str) -> None:
+def parse_sloleks_file(filepath: str) -> Dict[str, List[str]]:
     """
-    Initialize the LemmaFormsParser with the directory containing XML files.
+    Stream one Sloleks XML file into a lemma -> forms map.
 
-    :param directory: The directory path containing XML files.
-    """
+    Each <entry> is cleared (and dropped from the root) as soon as it is
+    read, so memory stays at about one entry however large the file is.
 
+    :param filepath: Path to a Sloleks XML file.
+    :return: Forms of every lemma in the file, in document order.
+    """
     data: Dict[str, List[str]] = {}
+    root = None
+    for event, elem in Et.iterparse(filepath, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end" or elem.tag != "entry":
+            continue
+        lemma = elem.find(".//lemma").text.strip()
+        forms = data.setdefault(lemma, [])
+        for orthlist in elem.iter("orthographyList"):
+            for form in orthlist.iter("form"):
+                forms.append(form.text.strip())
+        elem.clear()
+        if len(root) and root[-1] is elem:
+            del root[:]
+    return data
+
+
+def merge_maps(partials: Iterable[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    """Join per-file lemma -> forms maps, keeping each lemma's forms unique."""
+    data: Dict[str, List[str]] = {}
+    for partial in partials:
+        for lemma, forms in partial.items():
+            data.setdefault(lemma, []).extend(forms)
+    return {lemma: list(dict.fromkeys(forms)) for lemma, forms in data.items()}
 
-    for filename in os.listdir(directory):
-        if filename.endswith(".xml"):
-            filepath = os.path.join(directory, filename)
-            tree = Et.parse(filepath)
-            root = tree.getroot()
-            for entry in root.findall(".//entry"):
-                lemma = entry.find(".//lemma").text.strip()
-                for orthlist in entry.findall(".//orthographyList"):
-                    for form in orthlist.findall(".//form"):
-                        wordform = form.text.strip()
-                        if lemma in data:
-                            data[lemma].append(wordform)
-                        else:
-                            data[lemma] = [wordform]
-
-    with open(filepath, "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
-
-
-def reverse_json_writer(read, write):
-    with open(read, "r", encoding="utf-8") as r_file:
-        data = json.load(r_file)
 
-    search: Dict[str, Set[str]] = {}
+def reverse_map(data: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Turn lemma -> forms into form -> lemmas."""
+    search: Dict[str, Dict[str, None]] = {}
     for lemma, forms in data.items():
         for form in forms:
-            if form not in search:
-                search[form] = {lemma}
-            else:
-                search[form].add(lemma)
-
-    json_output: Dict[str, List[str]] = {}
-    for form, lemmas in search.items():
-        json_output[form] = list(lemmas)
+            search.setdefault(form, {})[lemma] = None
+    return {form: list(lemmas) for form, lemmas in search.items()}
 
-    print("done!")
-    with open(write, "w", encoding="utf-8") as w_file:
-        json.dump(json_output, w_file, ensure_ascii=False, indent=4)
 
-# Used to split because the upper case words are annoying
-def split_json(json_file):
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+def lemma_forms_parser(directory: str, output_dir: str,
+                       processes: int = None) -> None:
+    """
+    Build forward_map.json (lemma -> forms) and backward_map.json
+    (form -> lemmas) from a directory of Sloleks XML files.
 
-    upper_keys = {k: v for k, v in data.items() if k[0].isupper()}
-    lower_keys = {k: v for k, v in data.items() if k[0].islower()}
+    Files are parsed in parallel, one per worker process, and the partial
+    maps are merged in file name order so the output is reproducible.
 
-    with open('uppercase_keys.json', 'w', encoding='utf-8') as f:
-        json.dump(upper_keys, f, indent=4, ensure_ascii=False)
+    :param directory: The directory path containing XML files.
+    :param output_dir: Where both maps are written; created if missing.
+    :param processes: Worker processes; defaults to the CPU count.
+    """
+    filepaths = sorted(os.path.join(directory, filename)
+                       for filename in os.listdir(directory)
+                       if filename.endswith(".xml"))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        data = merge_maps(executor.map(parse_sloleks_file, filepaths))
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "forward_map.json"), "w",
+              encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=4)
+    with open(os.path.join(output_dir, "backward_map.json"), "w",
+              encoding="utf-8") as file:
+        json.dump(reverse_map(data), file, ensure_ascii=False, indent=4)
 
-    with open('lowercase_keys.json', 'w', encoding='utf-8') as f:
-        json.dump(lower_keys, f, indent=4, ensure_ascii=False)
 
 if __name__ == "__main__":
-    x = r"C:\Users\sangha\Documents\Danny's\TextToAnki\data\lexicon.json"
-    read = "forward_map.json"
-    write = "backward_map.json"
-    reverse_json_writer(read, write)
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build forward and backward maps from Sloleks XML.")
+    parser.add_argument("xml_dir", help="directory of Sloleks .xml files")
+    parser.add_argument("-o", "--output", required=True,
+                        help="directory for forward_map.json and "
+                             "backward_map.json")
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    args = parser.parse_args()
+    lemma_forms_parser(args.xml_dir, args.output, args.processes)
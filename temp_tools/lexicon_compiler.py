@@ -0,0 +1,478 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import json_maker
+
+### Builds a language pack's lex/ folder in one pass over the source
+### entries: the forward map split by lemma case, and the backward map
+### compiled for memory-mapped lookups. Later runs only re-parse source
+### files whose content changed and apply the lemmas that differ. The DPD
+### is built as forward.bin instead of the JSON forward maps; its first
+### build is usually streamed by dpd_extractor.py, which writes the same
+### manifest.
+
+APP_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'text_to_anki'))
+sys.path.insert(0, APP_DIR)
+
+from lexicon_store import (COMPILED_NAME,  # noqa: E402
+                           FORWARD_COMPILED_NAME, SQLITE_NAME,
+                           CompiledLexicon, write_compiled_lexicon,
+                           write_sqlite_lexicon)
+
+PACKS_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'language_packs'))
+FORWARD_NAME = 'forward_map.json'
+UPPERCASE_NAME = 'uppercase_forward.json'
+BACKWARD_NAME = 'backward_map.json'
+MANIFEST_NAME = 'build_manifest.json'
+MANIFEST_VERSION = 2
+
+# Source kind -> outputs written by every build of it.
+BASE_OUTPUTS = {
+    'sloleks': (FORWARD_NAME, UPPERCASE_NAME, COMPILED_NAME),
+    'forward-json': (FORWARD_NAME, UPPERCASE_NAME, COMPILED_NAME),
+    'dpd': (FORWARD_COMPILED_NAME, COMPILED_NAME),
+}
+# Optional copies of lexicon.bin in other formats. Once one exists in the
+# output directory every later build rewrites it, so it never goes stale.
+DERIVED_OUTPUTS = (BACKWARD_NAME, SQLITE_NAME)
+
+Entry = Tuple[str, List[str]]
+Partial = Dict[str, List[str]]
+
+
+def read_forward_json(path: str) -> Partial:
+    """Read an existing lemma -> forms JSON map."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def read_dpd(path: str) -> Partial:
+    """Read the dpd_headwords rows of a dpd.db."""
+    # dpd_extractor imports this module, so import it late.
+    from dpd_extractor import iter_headwords
+    data: Partial = {}
+    for lemma, forms in iter_headwords(path):
+        if forms:
+            data.setdefault(lemma, []).extend(forms)
+    return data
+
+
+# Source kind -> parser turning one source file into lemma -> forms.
+PARSERS: Dict[str, Callable[[str], Partial]] = {
+    'sloleks': json_maker.parse_sloleks_file,
+    'forward-json': read_forward_json,
+    'dpd': read_dpd,
+}
+
+
+def source_files(kind: str, source: str) -> List[str]:
+    """Source files for `kind`, in the order their entries are merged."""
+    if kind == 'sloleks':
+        return sorted(os.path.join(source, filename)
+                      for filename in os.listdir(source)
+                      if filename.endswith('.xml'))
+    return [source]
+
+
+def parse_files(
+        kind: str,
+        paths: List[str],
+        processes: int = None
+) -> Iterator[Tuple[str, Partial]]:
+    """
+    Yield (path, lemma -> forms) for each of `paths`, in order.
+
+    Several files are parsed in worker processes; only one file's partial
+    map is held here at a time.
+    """
+    parse = PARSERS[kind]
+    if len(paths) <= 1:
+        for path in paths:
+            yield path, parse(path)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from zip(paths, executor.map(parse, paths))
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(forms: Iterable[str]) -> str:
+    """Short hash of a headword's forms, in source order."""
+    return hashlib.blake2b('\0'.join(forms).encode('utf-8'),
+                           digest_size=8).hexdigest()
+
+
+def file_record(path: str, partial: Partial) -> Dict:
+    return {'sha256': file_digest(path),
+            'lemmas': {lemma: fingerprint(forms)
+                       for lemma, forms in partial.items()}}
+
+
+class LexiconBuilder:
+    """
+    Accumulates forward and backward maps from one stream of entries.
+
+    Forms and lemmas keep first-seen order and are de-duplicated, so a
+    lemma spread over several source files is merged rather than repeated.
+    """
+
+    def __init__(self) -> None:
+        self.forward: Dict[str, Dict[str, None]] = {}
+        self.backward: Dict[str, Dict[str, None]] = {}
+
+    def add(self, lemma: str, forms: Iterable[str]) -> None:
+        known = self.forward.setdefault(lemma, {})
+        for form in forms:
+            if form and form not in known:
+                known[form] = None
+                self.backward.setdefault(form, {})[lemma] = None
+
+    def add_all(self, entries: Iterable[Entry]) -> None:
+        for lemma, forms in entries:
+            self.add(lemma, forms)
+
+    def remove(self, lemma: str) -> None:
+        for form in self.forward.pop(lemma, ()):
+            lemmas = self.backward.get(form)
+            if lemmas is not None:
+                lemmas.pop(lemma, None)
+                if not lemmas:
+                    del self.backward[form]
+
+    def replace(self, lemma: str, forms: List[str]) -> None:
+        """Swap in the new forms of `lemma`; no forms removes it."""
+        self.remove(lemma)
+        if forms:
+            self.add(lemma, forms)
+
+    @classmethod
+    def load(cls, output_dir: str) -> 'LexiconBuilder':
+        """Rebuild the in-memory maps from a previous `write`."""
+        builder = cls()
+        if os.path.exists(os.path.join(output_dir, FORWARD_NAME)):
+            for name in (FORWARD_NAME, UPPERCASE_NAME):
+                builder.add_all(
+                    read_forward_json(os.path.join(output_dir, name)).items())
+        else:
+            forward = CompiledLexicon(
+                os.path.join(output_dir, FORWARD_COMPILED_NAME))
+            try:
+                builder.add_all(forward.items())
+            finally:
+                forward.close()
+        compiled = CompiledLexicon(os.path.join(output_dir, COMPILED_NAME))
+        try:
+            for form, lemmas in compiled.items():
+                for lemma in lemmas:
+                    builder.backward.setdefault(form, {})[lemma] = None
+        finally:
+            compiled.close()
+        return builder
+
+    def partitions(self) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """Split the forward map into (lowercase, uppercase) lemmas."""
+        lower: Dict[str, List[str]] = {}
+        upper: Dict[str, List[str]] = {}
+        for lemma, forms in self.forward.items():
+            target = upper if lemma[:1].isupper() else lower
+            target[lemma] = list(forms)
+        return lower, upper
+
+    def write(self, output_dir: str, outputs: Iterable[str]) -> List[str]:
+        """
+        Write `outputs` into `output_dir`.
+
+        :param outputs: Iterable[str]: Output names; lexicon.bin is always
+            written, and any DERIVED_OUTPUTS are regenerated from it.
+        :return: List[str]: Paths written.
+        """
+        outputs = list(outputs)
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+        if FORWARD_NAME in outputs:
+            lower, upper = self.partitions()
+            written += [
+                _dump(lower.items(), os.path.join(output_dir, FORWARD_NAME)),
+                _dump(upper.items(), os.path.join(output_dir, UPPERCASE_NAME))]
+        if FORWARD_COMPILED_NAME in outputs:
+            forward_path = os.path.join(output_dir, FORWARD_COMPILED_NAME)
+            write_compiled_lexicon(self.forward, forward_path)
+            written.append(forward_path)
+
+        compiled_path = os.path.join(output_dir, COMPILED_NAME)
+        write_compiled_lexicon(self.backward, compiled_path)
+        written.append(compiled_path)
+        written.extend(write_derived(
+            output_dir, [name for name in outputs if name in DERIVED_OUTPUTS]))
+        return written
+
+
+def _dump(items: Iterable[Entry], path: str) -> str:
+    """Write `items` as one compact JSON object, without building it."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write('{')
+        for index, (key, values) in enumerate(items):
+            file.write(',' if index else '')
+            file.write(json.dumps(key, ensure_ascii=False))
+            file.write(':')
+            file.write(json.dumps(list(values), ensure_ascii=False,
+                                  separators=(',', ':')))
+        file.write('}')
+    os.replace(temp_path, path)
+    return path
+
+
+def derived_outputs(output_dir: str,
+                    requested: Iterable[str] = ()) -> List[str]:
+    """Derived outputs to write: those requested plus any already there."""
+    requested = set(requested)
+    return [name for name in DERIVED_OUTPUTS
+            if name in requested or
+            os.path.exists(os.path.join(output_dir, name))]
+
+
+def write_derived(output_dir: str, names: Iterable[str]) -> List[str]:
+    """Regenerate derived outputs from lexicon.bin in `output_dir`."""
+    names = list(names)
+    if not names:
+        return []
+    written = []
+    compiled = CompiledLexicon(os.path.join(output_dir, COMPILED_NAME))
+    try:
+        for name in names:
+            path = os.path.join(output_dir, name)
+            if name == SQLITE_NAME:
+                write_sqlite_lexicon(compiled, path)
+            else:
+                _dump(compiled.items(), path)
+            written.append(path)
+    finally:
+        compiled.close()
+    return written
+
+
+def full_build(kind: str, paths: List[str],
+               processes: int = None) -> Tuple[LexiconBuilder, Dict]:
+    """Parse every source file and fingerprint all of it."""
+    builder = LexiconBuilder()
+    files: Dict[str, Dict] = {}
+    for path, partial in parse_files(kind, paths, processes):
+        builder.add_all(partial.items())
+        files[os.path.basename(path)] = file_record(path, partial)
+    return builder, files
+
+
+def incremental_build(
+        output_dir: str,
+        manifest: Dict,
+        paths: List[str],
+        processes: int = None
+) -> Tuple[Optional[LexiconBuilder], Dict, Dict[str, int]]:
+    """
+    Apply only what changed since the build recorded in `manifest`.
+
+    Source files whose hash is unchanged are not parsed, unless they also
+    hold a headword that changed elsewhere (its forms are the union over
+    every file). Only added, removed and changed headwords are replaced
+    in the previous maps.
+
+    :return: (builder, files, counts); builder is None when nothing changed.
+    """
+    kind = manifest['source']
+    old_files: Dict[str, Dict] = manifest['files']
+    by_name = {os.path.basename(path): path for path in paths}
+    digests = {name: file_digest(path) for name, path in by_name.items()}
+    changed = [name for name in by_name
+               if old_files.get(name, {}).get('sha256') != digests[name]]
+    removed = [name for name in old_files if name not in by_name]
+    counts = {'files': len(changed) + len(removed),
+              'added': 0, 'changed': 0, 'removed': 0}
+    if not changed and not removed:
+        return None, old_files, counts
+
+    files = {name: record for name, record in old_files.items()
+             if name in by_name}
+    parsed: Dict[str, Partial] = {}
+    for path, partial in parse_files(
+            kind, [by_name[name] for name in changed], processes):
+        name = os.path.basename(path)
+        parsed[name] = partial
+        files[name] = {'sha256': digests[name],
+                       'lemmas': {lemma: fingerprint(forms)
+                                  for lemma, forms in partial.items()}}
+
+    touched = set()
+    for name in changed + removed:
+        old = old_files.get(name, {}).get('lemmas', {})
+        new = files.get(name, {}).get('lemmas', {})
+        touched.update(lemma for lemma in old.keys() | new.keys()
+                       if old.get(lemma) != new.get(lemma))
+    if not touched:
+        return None, files, counts
+
+    # Unchanged files that share a touched headword contribute its forms.
+    shared = [name for name in by_name
+              if name not in parsed and
+              not touched.isdisjoint(files[name]['lemmas'])]
+    for path, partial in parse_files(
+            kind, [by_name[name] for name in shared], processes):
+        parsed[os.path.basename(path)] = partial
+
+    builder = LexiconBuilder.load(output_dir)
+    order = sorted(parsed, key=list(by_name).index)
+    for lemma in touched:
+        forms: List[str] = []
+        for name in order:
+            forms.extend(parsed[name].get(lemma, ()))
+        existed = lemma in builder.forward
+        builder.replace(lemma, forms)
+        if not forms:
+            counts['removed'] += existed
+        else:
+            counts['changed' if existed else 'added'] += 1
+    return builder, files, counts
+
+
+def read_manifest(output_dir: str, kind: str) -> Optional[Dict]:
+    """The previous build's manifest, if its outputs can be reused."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    if (manifest.get('version') != MANIFEST_VERSION or
+            manifest.get('source') != kind or
+            not all(os.path.exists(os.path.join(output_dir, name))
+                    for name in manifest['outputs'])):
+        return None
+    return manifest
+
+
+def write_manifest(output_dir: str, kind: str, files: Dict,
+                   outputs: List[str]) -> None:
+    """Record the source fingerprints and the output names of a build."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({'version': MANIFEST_VERSION, 'source': kind,
+                   'outputs': outputs, 'files': files},
+                  file, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+def peak_memory_mb() -> float:
+    """Peak resident memory of this process and its workers, or -1."""
+    try:
+        import resource
+    except ImportError:
+        return -1
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def build(
+        kind: str,
+        source: str,
+        output_dir: str,
+        requested: Iterable[str] = (),
+        processes: int = None,
+        full: bool = False
+) -> Tuple[List[str], str]:
+    """
+    Build `output_dir` from `source`, incrementally when its manifest allows.
+
+    :param requested: Iterable[str]: DERIVED_OUTPUTS to write as well.
+    :param full: bool: Ignore the manifest and rebuild everything.
+    :return: (paths written, summary); no paths when already up to date.
+    """
+    paths = source_files(kind, source)
+    derived = derived_outputs(output_dir, requested)
+    manifest = None if full else read_manifest(output_dir, kind)
+    if manifest is None:
+        builder, files = full_build(kind, paths, processes)
+        summary = f"full build of {len(paths)} files"
+    else:
+        builder, files, counts = incremental_build(
+            output_dir, manifest, paths, processes)
+        summary = (f"{counts['files']} changed files, "
+                   f"+{counts['added']} ~{counts['changed']} "
+                   f"-{counts['removed']} lemmas")
+
+    outputs = list(BASE_OUTPUTS[kind]) + derived
+    if builder is not None:
+        written = builder.write(output_dir, outputs)
+    else:
+        # Sources are unchanged; only newly requested outputs are missing.
+        written = write_derived(output_dir, [
+            name for name in derived if name not in manifest['outputs']])
+    write_manifest(output_dir, kind, files, outputs)
+    return written, summary
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compile a language pack lexicon in a single pass.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sloleks', metavar='XML_DIR',
+                        help='directory of Sloleks .xml files')
+    source.add_argument('--forward-json', metavar='PATH',
+                        help='existing lemma -> forms JSON map')
+    source.add_argument('--dpd', metavar='DB',
+                        help='dpd.db from a Digital Pali Dictionary release')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--lang', help='language pack to write into')
+    target.add_argument('-o', '--output', help='output directory')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='XML parser processes (default: CPU count)')
+    parser.add_argument('--backward-json', action='store_true',
+                        help='also write backward_map.json')
+    parser.add_argument('--sqlite', action='store_true',
+                        help='also write lexicon.db')
+    parser.add_argument('--full', action='store_true',
+                        help='ignore the build manifest and rebuild all')
+    args = parser.parse_args(argv)
+
+    output_dir = args.output or os.path.join(PACKS_DIR, args.lang, 'lex')
+    if args.sloleks:
+        kind, source = 'sloleks', args.sloleks
+    elif args.forward_json:
+        kind, source = 'forward-json', args.forward_json
+    else:
+        kind, source = 'dpd', args.dpd
+    requested = ([BACKWARD_NAME] if args.backward_json else []) + \
+                ([SQLITE_NAME] if args.sqlite else [])
+    started = time.perf_counter()
+    written, summary = build(kind, source, output_dir, requested,
+                             args.processes, args.full)
+
+    elapsed = time.perf_counter() - started
+    for path in written:
+        print(f"wrote {path} ({os.path.getsize(path) / (1 << 20):.1f} MB)")
+    if not written:
+        print(f"{output_dir} is up to date")
+    peak = peak_memory_mb()
+    print(f"{summary} in {elapsed:.1f}s, peak memory "
+          + (f"{peak:.0f} MB" if peak >= 0 else "n/a"))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
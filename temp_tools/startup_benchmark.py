@@ -0,0 +1,70 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from typing import Dict, List, Tuple
+
+### Measures GUI import cost with `python -X importtime` and fails when a
+### heavy optional dependency sneaks back into startup.
+
+APP_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'text_to_anki'))
+DEFERRED = ('nltk', 'pydub', 'openai', 'pandas', 'torch')
+
+
+def measure(module: str = 'text_analysis_app') -> Dict[str, Tuple[int, int]]:
+    """
+    Import `module` in a fresh interpreter.
+
+    :return: Mapping of every imported module to (self, cumulative) time in
+        microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"importing {module} failed")
+
+    timings: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='text_analysis_app')
+    parser.add_argument('--budget-ms', type=float, default=150.0,
+                        help='fail if the import takes longer than this')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    timings = measure(args.module)
+    total_ms = timings[args.module][1] / 1000
+    slowest = sorted(timings.items(), key=lambda item: item[1][1],
+                     reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:args.top]:
+        print(f"{cumulative_us / 1000:8.1f} ms  {self_us / 1000:8.1f} ms  "
+              f"{name}")
+    print(f"total: {total_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+
+    failed = False
+    loaded = sorted({name.split('.')[0] for name in timings} &
+                    set(DEFERRED))
+    if loaded:
+        print(f"FAIL: imported at startup: {', '.join(loaded)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
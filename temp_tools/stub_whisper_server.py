@@ -0,0 +1,82 @@
+import argparse
+import hashlib
+import json
+import random
+import time
+
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+### Offline stand-in for the OpenAI transcription endpoint.
+### Point the transcriber at it with base_url="http://127.0.0.1:<port>/v1"
+### (or "base_url" in data/users/user.json) and any api key.
+###
+### Each reply names the uploaded file and a short hash of its bytes, so the
+### order of reassembled transcripts can be checked against the input.
+
+
+def parse_form(content_type: str, body: bytes) -> dict:
+    """Return the multipart form fields as {name: (filename, bytes)}."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+
+def make_handler(delay: float, fail_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if not self.path.endswith("/audio/transcriptions"):
+                self._reply(404, {"error": {"message": "not found"}})
+                return
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            if random.random() < fail_rate:
+                self._reply(503, {"error": {"message": "stub failure"}})
+                return
+            fields = parse_form(self.headers["Content-Type"], body)
+            filename, data = fields.get("file", ("", b""))
+            digest = hashlib.sha1(data or b"").hexdigest()[:8]
+            text = f"[{filename} {digest}]"
+            response_format = fields.get("response_format", (None, b"json"))
+            if response_format[1] != b"verbose_json":
+                self._reply(200, {"text": text})
+                return
+            # Two fixed cues per upload; enough to check offsets in the file
+            segments = [
+                {"id": 0, "start": 0.0, "end": 1.5, "text": f" {text} a"},
+                {"id": 1, "start": 1.5, "end": 3.0, "text": f" {text} b"},
+            ]
+            self._reply(200, {"task": "transcribe", "language": "slovenian",
+                              "duration": 3.0, "text": text,
+                              "segments": segments})
+
+        def _reply(self, status: int, payload: dict):
+            encoded = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+    return StubHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.5,
+                        help="average seconds per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="fraction of requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(args.delay, args.fail_rate))
+    print(f"stub transcription API on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
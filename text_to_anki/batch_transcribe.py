@@ -0,0 +1,248 @@
+import argparse
+import glob
+import os
+import sys
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import List, Optional
+
+from transcription_cache import TranscriptionCache
+from transcript_srt import cues_to_srt
+from whisper import (AudioTranscriber, SUPPORTED_FORMATS, load_user,
+                     make_job)
+
+
+def find_audio_files(sources: List[str], recursive: bool = False) -> List[str]:
+    """
+    Expands directories and glob patterns into audio file paths.
+
+    :param sources: List[str]: Files, directories or glob patterns.
+    :param recursive: bool: Also search subdirectories of directories.
+    :return: List[str]: Sorted, de-duplicated audio file paths.
+    """
+    found = set()
+    for source in sources:
+        if os.path.isdir(source):
+            pattern = os.path.join(source, '**' if recursive else '', '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif os.path.isfile(source):
+            found.add(os.path.abspath(source))
+            continue
+        else:
+            candidates = glob.glob(source, recursive=True)
+        for path in candidates:
+            extension = path.rsplit('.', 1)[-1].lower()
+            if os.path.isfile(path) and extension in SUPPORTED_FORMATS:
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def output_path(file_path: str, output_dir: Optional[str],
+                extension: str = '.txt', root: Optional[str] = None) -> str:
+    """
+    Transcript file for `file_path`: its full name plus `extension`, so
+    x.mp3 and x.wav in one folder do not share x.txt.
+
+    :param output_dir: Optional[str]: Mirror the audio's folders under here
+        instead of writing next to the audio.
+    :param root: Optional[str]: Folder the mirrored paths are relative to;
+        the audio file's own folder by default.
+    """
+    if output_dir is None:
+        return file_path + extension
+    relative = os.path.relpath(file_path, root or os.path.dirname(file_path))
+    return os.path.join(output_dir, relative + extension)
+
+
+def output_paths(files: List[str], output_dir: Optional[str],
+                 extension: str = '.txt') -> List[str]:
+    """
+    Transcript files for `files`, mirrored below their common folder.
+
+    :raises ValueError: If two inputs would write the same transcript.
+    """
+    root = None
+    if output_dir is not None and files:
+        root = os.path.commonpath([os.path.dirname(path) for path in files])
+    paths = [output_path(path, output_dir, extension, root) for path in files]
+    seen = {}
+    for file_path, transcript_path in zip(files, paths):
+        key = os.path.normcase(os.path.abspath(transcript_path))
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {file_path} would both be "
+                             f"written to {transcript_path}")
+        seen[key] = file_path
+    return paths
+
+
+def is_up_to_date(file_path: str, transcript_path: str) -> bool:
+    return (os.path.exists(transcript_path) and
+            os.path.getmtime(transcript_path) >= os.path.getmtime(file_path))
+
+
+class BatchTranscriber:
+    """
+    Transcribes many audio files with one shared pool of request workers,
+    so `workers` caps the requests in flight across all files together.
+
+    Each file runs as a resumable job, so an interrupted batch picks up at
+    the segments it had not finished.
+
+    :param api_key: str: The API key for OpenAI services.
+    :param prompt: str: Prompt sent with every segment.
+    :param base_url: str: Alternative API endpoint.
+    :param workers: int: Global limit on concurrent requests.
+    :param files_at_once: int: How many files are decoded in parallel.
+    :param segment_length: float: Length of each segment in minutes.
+    :param silence_tolerance: float: Seconds each cut may move to land in a
+        pause.
+    :param srt: bool: Write timestamped .srt subtitles instead of .txt.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            prompt: str = '',
+            base_url: str = None,
+            workers: int = 4,
+            files_at_once: int = 2,
+            segment_length: float = 15,
+            silence_tolerance: float = 10,
+            srt: bool = False
+    ) -> None:
+        self.api_key = api_key
+        self.prompt = prompt
+        self.base_url = base_url
+        self.workers = workers
+        self.files_at_once = files_at_once
+        self.segment_length = segment_length
+        self.silence_tolerance = silence_tolerance
+        self.srt = srt
+        self.extension = '.srt' if srt else '.txt'
+        self._print_lock = Lock()
+
+    def report(self, message: str) -> None:
+        with self._print_lock:
+            print(message, file=sys.stderr, flush=True)
+
+    def run(self, files: List[str], output_dir: str = None,
+            force: bool = False) -> List[str]:
+        """
+        Transcribes every file whose transcript is missing or older than
+        the audio.
+
+        :param files: List[str]: Audio files to transcribe.
+        :param output_dir: str: Where transcripts go; next to each audio
+            file by default.
+        :param force: bool: Redo files whose transcript is up to date.
+        :return: List[str]: The files that failed.
+        :raises ValueError: If two files map to the same transcript.
+        """
+        todo = []
+        transcript_paths = output_paths(files, output_dir, self.extension)
+        for file_path, transcript_path in zip(files, transcript_paths):
+            if not force and is_up_to_date(file_path, transcript_path):
+                self.report(f"skip  {file_path} (up to date)")
+                continue
+            todo.append((file_path, transcript_path))
+            os.makedirs(os.path.dirname(transcript_path), exist_ok=True)
+
+        failed = []
+        cache = TranscriptionCache()
+        # Segment requests from every file share this pool; files get their
+        # own threads so none of them blocks a request worker
+        with ThreadPoolExecutor(max_workers=self.workers) as requests, \
+                ThreadPoolExecutor(max_workers=self.files_at_once) as files_pool:
+            transcriber = AudioTranscriber(
+                self.api_key, self.prompt, base_url=self.base_url,
+                max_workers=self.workers, cache=cache, timestamps=self.srt,
+                executor=requests)
+            futures = {
+                files_pool.submit(self.transcribe_one, transcriber,
+                                  file_path, transcript_path): file_path
+                for file_path, transcript_path in todo
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    failed.append(file_path)
+                    self.report(f"FAIL  [{done}/{len(todo)}] {file_path}: "
+                                f"{error}")
+                else:
+                    self.report(f"done  [{done}/{len(todo)}] {file_path}")
+        cache.close()
+        return failed
+
+    def transcribe_one(self, transcriber: AudioTranscriber, file_path: str,
+                       transcript_path: str) -> None:
+        job = make_job(file_path, self.segment_length,
+                       self.silence_tolerance, self.prompt, self.srt)
+        name = os.path.basename(file_path)
+
+        def progress(finished: int) -> None:
+            self.report(f"      {name}: {finished} segment(s) transcribed")
+
+        transcriptions = transcriber.transcribe_file(
+            file_path, self.segment_length, self.silence_tolerance,
+            job=job, progress=progress)
+        if self.srt:
+            text = cues_to_srt(cue for cues in transcriptions for cue in cues)
+        else:
+            text = "\n".join(transcriptions)
+        temp_path = f"{transcript_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as transcript:
+            transcript.write(text)
+        os.replace(temp_path, transcript_path)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Transcribe a directory or glob of audio files.")
+    parser.add_argument('sources', nargs='+',
+                        help="audio files, directories or glob patterns")
+    parser.add_argument('-o', '--output-dir',
+                        help="where transcripts go (default: next to audio)")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="search directories recursively")
+    parser.add_argument('--prompt', default='')
+    parser.add_argument('--segment-length', type=float, default=15,
+                        help="minutes per segment")
+    parser.add_argument('--silence-tolerance', type=float, default=10,
+                        help="seconds a cut may move to land in a pause")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="requests in flight across all files")
+    parser.add_argument('--files-at-once', type=int, default=2)
+    parser.add_argument('--base-url', help="alternative API endpoint")
+    parser.add_argument('--srt', action='store_true',
+                        help="write timestamped .srt subtitles")
+    parser.add_argument('--force', action='store_true',
+                        help="redo files with an up to date transcript")
+    args = parser.parse_args(argv)
+
+    api_key, base_url = load_user()
+    if api_key is None:
+        print("OpenAI API key needed for this action", file=sys.stderr)
+        return 2
+    files = find_audio_files(args.sources, args.recursive)
+    if not files:
+        print("no audio files found", file=sys.stderr)
+        return 2
+
+    batch = BatchTranscriber(
+        api_key, args.prompt, base_url=args.base_url or base_url,
+        workers=args.workers, files_at_once=args.files_at_once,
+        segment_length=args.segment_length,
+        silence_tolerance=args.silence_tolerance, srt=args.srt)
+    try:
+        failed = batch.run(files, args.output_dir, args.force)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
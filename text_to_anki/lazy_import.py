@@ -0,0 +1,28 @@
+import importlib.util
+import sys
+
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return module `name` without executing it yet.
+
+    The module body runs on first attribute access, so heavy dependencies
+    (pydub, openai, nltk, ...) are only paid for by the features that use
+    them.
+
+    :param name: str: Absolute module name.
+    :return: ModuleType: The (possibly not yet loaded) module.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,496 @@
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+# Compiled lexicon layout (all integers little-endian uint32):
+#
+#   header          magic, form count, lemma count, link count
+#   form_offsets    [forms + 1]  byte offsets into the form blob
+#   link_offsets    [forms + 1]  offsets into the link table
+#   links           [links]      lemma ids, one run per form
+#   lemma_offsets   [lemmas + 1] byte offsets into the lemma blob
+#   form blob       sorted, deduplicated UTF-8 wordforms
+#   lemma blob      sorted, deduplicated UTF-8 lemmas
+MAGIC = b"TTALEX01"
+_HEADER = struct.Struct("<8sIII")
+COMPILED_NAME = "lexicon.bin"
+FORWARD_COMPILED_NAME = "forward.bin"
+SQLITE_NAME = "lexicon.db"
+
+
+class CompiledLexicon:
+    """
+    Read-only, memory-mapped view of a compiled form -> lemmas map.
+
+    Nothing is decoded up front: lookups binary-search the sorted form
+    table directly in the mapped file, so opening costs the same no matter
+    how many wordforms the lexicon holds.
+
+    :param path: str: Path to a file written by `write_compiled_lexicon`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_forms, n_lemmas, n_links = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a compiled lexicon")
+        self.form_count = n_forms
+        self.lemma_count = n_lemmas
+
+        pos = _HEADER.size
+        self._form_offsets, pos = self._table(pos, n_forms + 1)
+        self._link_offsets, pos = self._table(pos, n_forms + 1)
+        self._links, pos = self._table(pos, n_links)
+        self._lemma_offsets, pos = self._table(pos, n_lemmas + 1)
+        self._form_base = pos
+        self._lemma_base = pos + _padded(self._form_offsets[n_forms])
+
+    def _table(self, pos: int, length: int):
+        end = pos + 4 * length
+        if sys.byteorder == "little":
+            view = memoryview(self._mm)[pos:end].cast("I")
+        else:
+            view = array("I", self._mm[pos:end])
+            view.byteswap()
+        return view, end
+
+    def _form(self, index: int) -> bytes:
+        start = self._form_base + self._form_offsets[index]
+        end = self._form_base + self._form_offsets[index + 1]
+        return self._mm[start:end]
+
+    def _find_form(self, word: str) -> int:
+        key = word.encode("utf-8")
+        low, high = 0, self.form_count
+        while low < high:
+            mid = (low + high) // 2
+            if self._form(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.form_count and self._form(low) == key:
+            return low
+        return -1
+
+    def lemma_name(self, lemma_id: int) -> str:
+        start = self._lemma_base + self._lemma_offsets[lemma_id]
+        end = self._lemma_base + self._lemma_offsets[lemma_id + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def lemma_id(self, lemma: str) -> int:
+        """Return the id of `lemma`, or -1 if it is not in the lexicon."""
+        key = lemma.encode("utf-8")
+        low, high = 0, self.lemma_count
+        while low < high:
+            mid = (low + high) // 2
+            start = self._lemma_base + self._lemma_offsets[mid]
+            end = self._lemma_base + self._lemma_offsets[mid + 1]
+            if self._mm[start:end] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.lemma_count and self.lemma_name(low) == lemma:
+            return low
+        return -1
+
+    def lemma_ids(self, word: str) -> List[int]:
+        """Return the ids of all lemmas that `word` is a form of."""
+        index = self._find_form(word)
+        if index < 0:
+            return []
+        return list(self._links[self._link_offsets[index]:
+                                self._link_offsets[index + 1]])
+
+    def get(self, word: str, default=None) -> Optional[List[str]]:
+        """Dict-style lookup returning lemma strings for `word`."""
+        ids = self.lemma_ids(word)
+        if not ids:
+            return default
+        return [self.lemma_name(lemma_id) for lemma_id in ids]
+
+    def items(self) -> Iterator[Tuple[str, List[str]]]:
+        """Yield every (form, lemmas) pair in form order."""
+        names = [self.lemma_name(i) for i in range(self.lemma_count)]
+        for index in range(self.form_count):
+            ids = self._links[self._link_offsets[index]:
+                              self._link_offsets[index + 1]]
+            yield (self._form(index).decode("utf-8"),
+                   [names[lemma_id] for lemma_id in ids])
+
+    def __contains__(self, word: str) -> bool:
+        return self._find_form(word) >= 0
+
+    def __len__(self) -> int:
+        return self.form_count
+
+    def close(self) -> None:
+        for view in (self._form_offsets, self._link_offsets, self._links,
+                     self._lemma_offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mm.close()
+
+
+def _padded(size: int) -> int:
+    return (size + 3) & ~3
+
+
+def _blob(strings: List[str]):
+    offsets = array("I", [0])
+    parts = []
+    size = 0
+    for string in strings:
+        encoded = string.encode("utf-8")
+        parts.append(encoded)
+        size += len(encoded)
+        offsets.append(size)
+    blob = b"".join(parts)
+    return offsets, blob + b"\0" * (_padded(len(blob)) - len(blob))
+
+
+def write_compiled_lexicon(
+        form_lemmas: Mapping[str, Iterable[str]],
+        path: str
+) -> None:
+    """
+    Compile a form -> lemmas map (the shape of backward_map.json) into the
+    memory-mappable format read by `CompiledLexicon`.
+
+    :param form_lemmas: Mapping of each wordform to its lemmas.
+    :param path: str: Destination file; replaced atomically.
+    """
+    forms = sorted(form_lemmas)
+    lemmas = sorted({lemma for found in form_lemmas.values()
+                     for lemma in found})
+    lemma_ids: Dict[str, int] = {lemma: i for i, lemma in enumerate(lemmas)}
+
+    link_offsets = array("I", [0])
+    links = array("I")
+    for form in forms:
+        links.extend(sorted({lemma_ids[lemma]
+                             for lemma in form_lemmas[form]}))
+        link_offsets.append(len(links))
+
+    form_offsets, form_blob = _blob(forms)
+    lemma_offsets, lemma_blob = _blob(lemmas)
+
+    tables = [form_offsets, link_offsets, links, lemma_offsets]
+    if sys.byteorder != "little":
+        for table in tables:
+            table.byteswap()
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, len(forms), len(lemmas), len(links)))
+        for table in tables:
+            table.tofile(file)
+        file.write(form_blob)
+        file.write(lemma_blob)
+    os.replace(temp_path, path)
+
+
+class _Section:
+    """Append-only uint32 table or byte blob spooled to a temp file."""
+
+    def __init__(self, flush_at: int = 1 << 16) -> None:
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+        self._buffer = array("I")
+        self._flush_at = flush_at
+
+    def append(self, value: int) -> None:
+        self._buffer.append(value)
+        if len(self._buffer) >= self._flush_at:
+            self.flush()
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self) -> None:
+        if sys.byteorder != "little":
+            self._buffer.byteswap()
+        self.write(self._buffer.tobytes())
+        self._buffer = array("I")
+
+    def copy_to(self, file) -> None:
+        self.flush()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, file)
+        self.file.close()
+
+
+def write_compiled_stream(
+        links: Iterable[Tuple[str, int]],
+        lemmas: Iterable[str],
+        path: str
+) -> None:
+    """
+    Compile a form -> lemmas map without holding it in memory.
+
+    Produces the same file as `write_compiled_lexicon`, but reads its input
+    once from iterators (e.g. database cursors) and spools each table to a
+    temp file, so memory stays flat however large the lexicon is.
+
+    :param links: (form, lemma id) pairs sorted by form (UTF-8 byte order)
+        and then by id, without duplicates.
+    :param lemmas: Every lemma in sorted order; a lemma's id is its index.
+    :param path: str: Destination file; replaced atomically.
+    """
+    form_offsets, link_offsets = _Section(), _Section()
+    link_table, form_blob = _Section(), _Section()
+    form_offsets.append(0)
+    link_offsets.append(0)
+    n_forms = n_links = 0
+    previous = None
+    for form, lemma_id in links:
+        if form != previous:
+            if previous is not None:
+                form_offsets.append(form_blob.size)
+                link_offsets.append(n_links)
+            form_blob.write(form.encode("utf-8"))
+            n_forms += 1
+            previous = form
+        link_table.append(lemma_id)
+        n_links += 1
+    if previous is not None:
+        form_offsets.append(form_blob.size)
+        link_offsets.append(n_links)
+
+    lemma_offsets, lemma_blob = _Section(), _Section()
+    lemma_offsets.append(0)
+    n_lemmas = 0
+    for lemma in lemmas:
+        lemma_blob.write(lemma.encode("utf-8"))
+        lemma_offsets.append(lemma_blob.size)
+        n_lemmas += 1
+
+    for blob in (form_blob, lemma_blob):
+        blob.write(b"\0" * (_padded(blob.size) - blob.size))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, n_forms, n_lemmas, n_links))
+        for section in (form_offsets, link_offsets, link_table,
+                        lemma_offsets, form_blob, lemma_blob):
+            section.copy_to(file)
+    os.replace(temp_path, path)
+
+
+class SqliteLexicon:
+    """
+    Form -> lemmas map in an indexed SQLite database.
+
+    Opening reads only the row counts. Each lookup is an index probe on
+    forms(form), and `lookup_many` resolves a whole batch of words with one
+    temp-table join. Recent results sit in a bounded LRU. Safe to share
+    between analysis threads.
+
+    :param path: str: Path to a file written by `write_sqlite_lexicon`.
+    :param cache_size: int: Words (and lemma names) kept in the LRU.
+    """
+
+    _FORM = ("SELECT f.lemma_id, l.lemma FROM forms f"
+             " JOIN lemmas l ON l.id = f.lemma_id"
+             " WHERE f.form = ? ORDER BY f.lemma_id")
+    _BATCH = ("SELECT q.form, f.lemma_id, l.lemma FROM temp.query q"
+              " JOIN forms f ON f.form = q.form"
+              " JOIN lemmas l ON l.id = f.lemma_id"
+              " ORDER BY q.form, f.lemma_id")
+    _LEMMAS = ("SELECT l.id FROM temp.query q"
+               " JOIN lemmas l ON l.lemma = q.form")
+
+    def __init__(self, path: str, cache_size: int = 1 << 16) -> None:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = Lock()
+        self._words: OrderedDict = OrderedDict()
+        self._names: OrderedDict = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        counts = dict(self._db.execute("SELECT key, value FROM meta"))
+        self.form_count = counts["forms"]
+        self.lemma_count = counts["lemmas"]
+        self._db.execute(
+            "CREATE TEMP TABLE query (form TEXT PRIMARY KEY)")
+
+    def _remember(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _store(self, word: str, rows) -> List[int]:
+        ids = []
+        for lemma_id, lemma in rows:
+            ids.append(lemma_id)
+            self._remember(self._names, lemma_id, lemma)
+        self._remember(self._words, word, ids)
+        return ids
+
+    def _query(self, sql: str, keys: Iterable[str]) -> List[Tuple]:
+        # Caller holds the lock. `keys` fill temp.query for `sql` to join.
+        with self._db:
+            self._db.execute("DELETE FROM temp.query")
+            self._db.executemany("INSERT OR IGNORE INTO temp.query VALUES (?)",
+                                 ((key,) for key in keys))
+            return self._db.execute(sql).fetchall()
+
+    def lookup_many(self, words: Iterable[str]) -> None:
+        """Resolve every uncached word in `words` with a single query."""
+        with self._lock:
+            missing = {word for word in words if word not in self._words}
+            if not missing:
+                return
+            found: Dict[str, List[Tuple[int, str]]] = {}
+            for form, lemma_id, lemma in self._query(self._BATCH, missing):
+                found.setdefault(form, []).append((lemma_id, lemma))
+            for word in missing:
+                self._store(word, found.get(word, ()))
+
+    def lemma_ids_of(self, lemmas: Iterable[str]) -> List[int]:
+        """Return the ids of those `lemmas` in the lexicon, in one query."""
+        with self._lock:
+            return [lemma_id for lemma_id, in self._query(self._LEMMAS,
+                                                          lemmas)]
+
+    def lemma_ids(self, word: str) -> List[int]:
+        """Return the ids of all lemmas that `word` is a form of."""
+        with self._lock:
+            ids = self._words.get(word)
+            if ids is not None:
+                self._words.move_to_end(word)
+                return list(ids)
+            return list(self._store(word, self._db.execute(self._FORM,
+                                                           (word,))))
+
+    def lemma_name(self, lemma_id: int) -> str:
+        with self._lock:
+            name = self._names.get(lemma_id)
+            if name is None:
+                name, = self._db.execute(
+                    "SELECT lemma FROM lemmas WHERE id = ?",
+                    (lemma_id,)).fetchone()
+                self._remember(self._names, lemma_id, name)
+            return name
+
+    def lemma_id(self, lemma: str) -> int:
+        """Return the id of `lemma`, or -1 if it is not in the lexicon."""
+        with self._lock:
+            row = self._db.execute("SELECT id FROM lemmas WHERE lemma = ?",
+                                   (lemma,)).fetchone()
+        return row[0] if row is not None else -1
+
+    def get(self, word: str, default=None) -> Optional[List[str]]:
+        """Dict-style lookup returning lemma strings for `word`."""
+        ids = self.lemma_ids(word)
+        if not ids:
+            return default
+        return [self.lemma_name(lemma_id) for lemma_id in ids]
+
+    def __contains__(self, word: str) -> bool:
+        return bool(self.lemma_ids(word))
+
+    def __len__(self) -> int:
+        return self.form_count
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def write_sqlite_lexicon(form_lemmas, path: str) -> None:
+    """
+    Store a form -> lemmas map (a dict, or anything with the same `items()`,
+    such as `CompiledLexicon`) in the SQLite layout read by `SqliteLexicon`.
+
+    :param path: str: Destination file; replaced atomically.
+    """
+    lemmas = sorted({lemma for _, found in form_lemmas.items()
+                     for lemma in found})
+    lemma_ids: Dict[str, int] = {lemma: i for i, lemma in enumerate(lemmas)}
+
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    db = sqlite3.connect(temp_path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.execute("CREATE TABLE lemmas ("
+                   " id INTEGER PRIMARY KEY, lemma TEXT NOT NULL UNIQUE)")
+        db.execute("CREATE TABLE forms ("
+                   " form TEXT NOT NULL, lemma_id INTEGER NOT NULL)")
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER)")
+        db.executemany("INSERT INTO lemmas VALUES (?, ?)",
+                       enumerate(lemmas))
+        form_count = 0
+        links = []
+        for form, found in form_lemmas.items():
+            form_count += 1
+            links.extend((form, lemma_ids[lemma]) for lemma in set(found))
+            if len(links) >= 1 << 16:
+                db.executemany("INSERT INTO forms VALUES (?, ?)", links)
+                links.clear()
+        db.executemany("INSERT INTO forms VALUES (?, ?)", links)
+        # Covering index: lookups never touch the table itself.
+        db.execute("CREATE INDEX forms_form ON forms (form, lemma_id)")
+        db.executemany("INSERT INTO meta VALUES (?, ?)",
+                       [("forms", form_count), ("lemmas", len(lemmas))])
+        db.commit()
+    finally:
+        db.close()
+    os.replace(temp_path, path)
+
+
+def compile_json(json_path: str, path: str) -> None:
+    """Compile a backward_map.json file into `path`."""
+    with open(json_path, "r", encoding="utf-8") as file:
+        form_lemmas: Dict[str, List[str]] = json.load(file)
+    write_compiled_lexicon(form_lemmas, path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from tta_grammar import Language
+
+    parser = argparse.ArgumentParser(
+        description="Compile language pack backward maps.")
+    parser.add_argument("langs", nargs="+")
+    parser.add_argument("--sqlite", action="store_true",
+                        help=f"write {SQLITE_NAME} instead of {COMPILED_NAME}")
+    args = parser.parse_args()
+
+    for lang in args.langs:
+        language = Language(lang)
+        if args.sqlite:
+            if language.compiled is not None:
+                source = CompiledLexicon(language.compiled)
+            elif language.reverse is not None:
+                with open(language.reverse, "r", encoding="utf-8") as file:
+                    source = json.load(file)
+            else:
+                print(f"{lang}: no backward map to store")
+                continue
+            write_sqlite_lexicon(source, language.sqlite_path)
+            print(f"{lang}: wrote {language.sqlite_path}")
+            continue
+        if language.reverse is None:
+            print(f"{lang}: no backward_map.json to compile")
+            continue
+        compile_json(language.reverse, language.compiled_path)
+        print(f"{lang}: wrote {language.compiled_path}")
@@ -1,6 +1,7 @@
 import json
 import os
-from tkinter import Toplevel, Checkbutton, BooleanVar, StringVar, Label, Frame
+from tkinter import (Toplevel, Checkbutton, BooleanVar, StringVar, Label,
+                     Frame, Button)
 from tkinter.ttk import Combobox
 
 base_path = os.path.dirname(os.path.dirname(
@@ -8,12 +9,15 @@ base_path = os.path.dirname(os.path.dirname(
 default_json = os.path.join(base_path, "data", "settings", "default.json")
 
 class SettingsDialog:
-    def __init__(self, parent):
+    def __init__(self, parent, on_apply=None):
 
         self.top = Toplevel(parent)
         self.top.title("Settings")
+        self.on_apply = on_apply
         self.default_settings = load_default_settings()
+        self.language_var = None
         self.create_widgets()
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
 
     def create_widgets(self):
         # Exclusion List Filtering (Checkbox)
@@ -32,6 +36,9 @@ class SettingsDialog:
         checkbutton = Checkbutton(exclusion_frame, variable=self.exclusion_var)
         checkbutton.pack(side="left")
 
+        Button(self.top, text="Apply", command=self.apply_settings).pack(
+            side="bottom", pady=5)
+
         # Language (Dropdown Menu)
         language_options = self.get_language_options()  # Get list of language options
         if language_options:
@@ -59,9 +66,18 @@ class SettingsDialog:
         return language_folders
 
     def apply_settings(self):
-        # Implement logic to apply modified settings
-        # Update global variables in tta_grammar module
-        pass
+        self.default_settings["exclusion_list_filtering"] = \
+            self.exclusion_var.get()
+        if self.language_var is not None and self.language_var.get():
+            self.on_language_select(self.language_var.get())
+        self.save_default_settings()
+        # The app reloads its lexicon in the background from here
+        if self.on_apply is not None:
+            self.on_apply(dict(self.default_settings))
+
+    def close(self):
+        self.apply_settings()
+        self.top.destroy()
 
     def save_default_settings(self):
         with open(default_json, "w") as file:
@@ -1,15 +1,29 @@
 from tkinter import *
 from tkinter import Text, Menu
-from tkinter import messagebox, ttk
+from tkinter import filedialog, messagebox, ttk
 
 import re
-import whisper
 import os
-import json
 
-from tta_grammar import TextAnalyzer, Lexicon
-from transcript_srt import main as transcript_to_srt
+from functools import partial
+from lazy_import import lazy_import
+from threading import Event
+
+from tta_grammar import Lexicon, AnalysisCancelled, IncrementalAnalyzer
+from transcript_srt import save_srt
 from settings_dialog import SettingsDialog, load_default_settings
+from tk_tasks import TkTaskRunner
+
+# pydub and openai are only needed once "Transcribe Audio" is used
+whisper = lazy_import("whisper")
+
+# Result rows rendered per page; more are appended as the output scrolls
+OUTPUT_PAGE_SIZE = 2000
+# Pause in typing before live mode re-analyzes the edited paragraphs
+LIVE_DELAY_MS = 300
+# Saved .srt files larger than this (in bytes) are not loaded back into the
+# editor, since inserting them would stall the Text widget
+SRT_PREVIEW_LIMIT = 1_000_000
 
 
 class LanguageSelectDialog:
@@ -80,10 +94,30 @@ class TextAnalysisApp:
         self.root.minsize(420, 150)
         self.root.geometry("420x300")
 
-
-        self.lexicon = Lexicon(selected_language, self.settings)
+        self.tasks = TkTaskRunner(self.root)
+        self.lexicon = None
+        self._lexicon_task = None
+        self._analysis_queued = False
+        self._analysis_task = None
+        self._analysis_cancel = Event()
+        self._incremental = None
+        self._live_job = None
+        self._result = None
+        self._result_rows = None
+        self._rendered = 0
+        self._page_pending = False
+        self._show_frequencies = False
         self.setup_ui()
         self.create_menu()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.load_lexicon(selected_language)
+
+    def close(self):
+        # Stop background work first; the pool's threads would otherwise
+        # keep the process alive after the window is gone
+        self._analysis_cancel.set()
+        self.tasks.shutdown()
+        self.root.destroy()
 
     def setup_ui(self):
         # Set minimum size for rows and columns
@@ -104,6 +138,7 @@ class TextAnalysisApp:
                              lambda event: self.open_find_replace())
         self.input_text.bind("<Control-Return>",
                              lambda event: self.run_analysis())
+        self.input_text.bind("<<Modified>>", self._on_input_modified)
 
         self.input_text.focus_set()
 
@@ -129,7 +164,61 @@ class TextAnalysisApp:
 
         self.scroll = ttk.Scrollbar(self.root, command=self.output_text.yview)
         self.scroll.grid(row=2, column=5, sticky='ns')
-        self.output_text['yscrollcommand'] = self.scroll.set
+        self.output_text['yscrollcommand'] = self._on_output_scroll
+
+        self.status = StringVar()
+        ttk.Label(self.root, textvariable=self.status).grid(
+            row=3, column=0, sticky=W)
+        self.live = IntVar()
+        ttk.Checkbutton(self.root, text="Live", variable=self.live,
+                        command=self._on_input_modified).grid(
+            row=3, column=1, sticky=W)
+        self.progress = ttk.Progressbar(self.root, maximum=1.0)
+        self.progress.grid(row=3, column=2, sticky=W + E)
+        self.cancel_button = ttk.Button(self.root, text="Cancel",
+                                        command=self.cancel_analysis,
+                                        state=DISABLED)
+        self.cancel_button.grid(row=3, column=3, sticky=W + E)
+
+    # Lexicon
+    # lexicon (
+    def load_lexicon(self, language: str):
+        """Load the lexicon for `language` without blocking the UI."""
+        self.lexicon = None
+        self._incremental = None
+        self.status.set(f"Loading {language.title()} lexicon...")
+        task = self.tasks.submit(
+            self._build_lexicon, language, dict(self.settings),
+            on_done=lambda lexicon: self._lexicon_loaded(task, lexicon),
+            on_error=lambda error: self._lexicon_failed(task, error)
+        )
+        self._lexicon_task = task
+
+    @staticmethod
+    def _build_lexicon(language: str, settings: dict) -> Lexicon:
+        lexicon = Lexicon(language, settings)
+        lexicon.data  # force the lazy load while still off the UI thread
+        return lexicon
+
+    def _lexicon_loaded(self, task, lexicon: Lexicon):
+        if task is not self._lexicon_task:
+            return  # superseded by a later language switch
+        lexicon.apply_settings(self.settings)
+        self.lexicon = lexicon
+        self._incremental = IncrementalAnalyzer(lexicon)
+        self.status.set("Ready")
+        if self._analysis_queued:
+            self._analysis_queued = False
+            self.run_analysis()
+
+    def _lexicon_failed(self, task, error: BaseException):
+        if task is not self._lexicon_task:
+            return
+        self._analysis_queued = False
+        self.status.set("Lexicon failed to load")
+        messagebox.showerror("Error", str(error))
+
+    # ) lexicon
 
     def create_menu(self):
         menubar = Menu(self.root)
@@ -141,6 +230,8 @@ class TextAnalysisApp:
 
         file_menu.add_command(label="Transcribe Audio",
                               command=self.transcribe_audio)
+        file_menu.add_command(label="Transcribe Audio -> .srt",
+                              command=self.transcribe_audio_srt)
         file_menu.add_command(label="Transcript -> .srt",
                               command=self.srt)
         file_menu.add_separator()
@@ -167,16 +258,94 @@ class TextAnalysisApp:
         self.input_text.delete("1.0", END)
         self.input_text.insert("1.0", transcriptions)
 
+    def transcribe_audio_srt(self):
+        file_path = filedialog.askopenfilename(parent=self.root)
+        if not file_path:
+            return
+        self.status.set(f"Transcribing {os.path.basename(file_path)}...")
+        # Timestamps come back as cues, so no "MM:SS - text" pass is needed
+        self.tasks.submit(
+            partial(whisper.main, file_path=file_path, timestamps=True),
+            on_done=self._srt_transcribed,
+            on_error=self._transcription_failed
+        )
+
+    def _srt_transcribed(self, cues):
+        if isinstance(cues, str):  # no API key
+            self._transcription_failed(cues)
+            return
+        self.export_srt(cues)
+
+    def _transcription_failed(self, error):
+        self.status.set("Transcription failed")
+        messagebox.showerror("Error", str(error))
+
     def srt(self):
-        input_text = self.input_text.get("1.0", END)
-        srt_format: str = transcript_to_srt(input_text)
+        self.export_srt(self.input_text.get("1.0", END))
+
+    def export_srt(self, transcript):
+        """
+        Asks where to save, writes the SRT on a worker thread, and shows it
+        in the editor unless it is larger than SRT_PREVIEW_LIMIT.
+
+        :param transcript: A "MM:SS - text" transcript or a list of Cues.
+        """
+        path = filedialog.asksaveasfilename(
+            parent=self.root, defaultextension=".srt",
+            initialfile="output.srt",
+            filetypes=[("SubRip subtitles", "*.srt"), ("All files", "*.*")])
+        if not path:
+            return
+        self.status.set(f"Writing {os.path.basename(path)}...")
+        self.tasks.submit(
+            save_srt, transcript, path,
+            on_done=lambda count: self._srt_saved(path, count),
+            on_error=self._srt_failed
+        )
+
+    def _srt_saved(self, path: str, count: int):
+        name = os.path.basename(path)
+        if os.path.getsize(path) > SRT_PREVIEW_LIMIT:
+            self.status.set(f"Saved {count} cues to {name} "
+                            f"(too large to show)")
+            return
+        with open(path, "r", encoding="utf-8") as file:
+            srt_format: str = file.read()
         self.input_text.delete("1.0", END)
         self.input_text.insert("1.0", srt_format)
+        self.status.set(f"Saved {count} cues to {name}")
+
+    def _srt_failed(self, error: BaseException):
+        self.status.set("Saving .srt failed")
+        messagebox.showerror("Error", str(error))
 
     def open_settings(self):
         # Pass the appropriate path to the SettingsDialog instance
-        settings_dialog = SettingsDialog(self.root)
-
+        settings_dialog = SettingsDialog(self.root,
+                                         on_apply=self.apply_settings)
+
+    def apply_settings(self, settings: dict):
+        language_changed = settings.get("language") != self.settings.get(
+            "language")
+        # Anything in flight was computed with the old settings; drop it
+        # before the lexicon changes under it and run again afterwards
+        rerun = self._analysis_task is not None or self._analysis_queued
+        self._analysis_cancel.set()
+        if self._analysis_task is not None:
+            self._analysis_task = None
+            self._analysis_finished("Cancelled")
+        self.settings = settings
+        if language_changed:
+            language = settings.get("language")
+            self.root.title(f"The ▪{language.title()}▪ Box")
+            self.load_lexicon(language)
+        elif self.lexicon is not None:
+            self.lexicon.apply_settings(settings)
+            # Cached paragraph lemmas may now be filtered differently
+            self._incremental = IncrementalAnalyzer(self.lexicon)
+        if rerun:
+            # Waits for the new lexicon if one is loading
+            self.run_analysis()
 
     # ) file
 
@@ -211,19 +380,127 @@ class TextAnalysisApp:
 
 
     def run_analysis(self):
+        if self.lexicon is None:
+            # Picked up by _lexicon_loaded once the lexicon is ready
+            self._analysis_queued = True
+            self.status.set("Analysis queued until the lexicon is loaded")
+            return "break"
         text = self.input_text.get("1.0", END)
-        analyzer = TextAnalyzer(text, self.lexicon)
-        self.output_text.delete("1.0", END)
-        result = analyzer.lemma_frequencies if self.analysis_type.get() == 1 else analyzer.token_frequencies
-        sorted_items = sorted(result.items(), key=lambda item: item[1],
-                              reverse=True)
-        for item in sorted_items:
-            if self.return_frequencies.get() == 0:
-                self.output_text.insert(END, f'{item[0]}\n')
-            else:
-                self.output_text.insert(END, f'{item[0]}: {item[1]}\n')
+        lemmas = self.analysis_type.get() == 1
+        show_frequencies = self.return_frequencies.get() != 0
+
+        # A new run supersedes whatever is still in flight
+        self._analysis_cancel.set()
+        cancel = self._analysis_cancel = Event()
+        self.progress.configure(value=0)
+        task = self.tasks.submit(
+            self._analyze, text, self._incremental, lemmas, cancel,
+            on_done=lambda analysis: self._analysis_done(
+                task, analysis, show_frequencies),
+            on_error=lambda error: self._analysis_failed(task, error),
+            on_progress=lambda value: self.progress.configure(value=value)
+        )
+        self._analysis_task = task
+        self.status.set("Analyzing...")
+        self.cancel_button.configure(state=NORMAL)
         return "break"
 
+    @staticmethod
+    def _analyze(text: str, analyzer: IncrementalAnalyzer, lemmas: bool,
+                 cancel: Event, progress=None):
+        # Only paragraphs changed since the last run are re-analyzed
+        analyzer.update(text, progress=progress, cancel=cancel)
+        result = analyzer.snapshot(lemmas)
+        # Only the first page is shown, so a top-k selection is enough;
+        # the full sort waits until the user scrolls past it.
+        return result, result.most_common(OUTPUT_PAGE_SIZE)
+
+    def _on_input_modified(self, event=None):
+        self.input_text.edit_modified(False)
+        if self._live_job is not None:
+            self.root.after_cancel(self._live_job)
+            self._live_job = None
+        if self.live.get() and self.lexicon is not None:
+            self._live_job = self.root.after(LIVE_DELAY_MS,
+                                             self._live_update)
+
+    def _live_update(self):
+        self._live_job = None
+        self.run_analysis()
+
+    def cancel_analysis(self):
+        self._analysis_cancel.set()
+        self._analysis_task = None
+        self._analysis_finished("Cancelled")
+
+    def _analysis_finished(self, status: str):
+        self.status.set(status)
+        self.progress.configure(value=0)
+        self.cancel_button.configure(state=DISABLED)
+
+    def _analysis_done(self, task, analysis, show_frequencies: bool):
+        if task is not self._analysis_task:
+            return  # superseded or cancelled
+        self._analysis_task = None
+        self._result, head = analysis
+        self._result_rows = head if len(head) == len(self._result) else None
+        self._show_frequencies = show_frequencies
+        self._rendered = 0
+        self.output_text.delete("1.0", END)
+        self._render_rows(head)
+        self._analysis_finished("Ready")
+
+    def _render_rows(self, rows: list):
+        if not rows:
+            return
+        if self._show_frequencies:
+            lines = [f'{word}: {count}\n' for word, count in rows]
+        else:
+            lines = [f'{word}\n' for word, count in rows]
+        # One Tcl round trip for the whole page
+        self.output_text.insert(END, ''.join(lines))
+        self._rendered += len(rows)
+
+    def _on_output_scroll(self, first, last):
+        self.scroll.set(first, last)
+        if self._result is None or self._rendered >= len(self._result):
+            return
+        if float(last) > 0.9 and not self._page_pending:
+            self._page_pending = True
+            self.root.after_idle(self._render_next_page)
+
+    def _render_next_page(self):
+        if self._result_rows is None:
+            # The full sort is too slow for the Tk thread; the page is
+            # rendered once the worker hands the ordering back.
+            result = self._result
+            self.tasks.submit(
+                result.most_common,
+                on_done=lambda rows: self._rows_sorted(result, rows),
+                on_error=lambda error: self._rows_sorted(result, None)
+            )
+            return
+        self._page_pending = False
+        self._render_rows(self._result_rows[
+                          self._rendered:self._rendered + OUTPUT_PAGE_SIZE])
+
+    def _rows_sorted(self, result, rows):
+        self._page_pending = False
+        if result is not self._result or rows is None:
+            return  # replaced by a newer analysis, or the sort failed
+        self._result_rows = rows
+        self._render_next_page()
+
+    def _analysis_failed(self, task, error: BaseException):
+        if task is not self._analysis_task:
+            return
+        self._analysis_task = None
+        if isinstance(error, AnalysisCancelled):
+            self._analysis_finished("Cancelled")
+            return
+        self._analysis_finished("Analysis failed")
+        messagebox.showerror("Error", str(error))
+
 class PyStringDialog:
     """Dialog class for running Python code on a string."""
 
@@ -0,0 +1,81 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class Progress:
+    """Latest progress value reported by a worker, read by the Tk thread."""
+
+    def __init__(self) -> None:
+        self.value = None
+
+    def __call__(self, value) -> None:
+        self.value = value
+
+
+class TkTaskRunner:
+    """
+    Runs callables on worker threads and hands their results back on the Tk
+    main thread.
+
+    Tk widgets must only be touched from the thread running `mainloop`, so
+    finished futures are picked up by polling with `root.after` instead of
+    calling back from the worker.
+
+    :param root: The Tk root (or any widget) used for scheduling.
+    :param max_workers: int: Size of the thread pool.
+    :param poll_ms: int: How often pending tasks are checked.
+    """
+
+    def __init__(self, root, max_workers: int = 2, poll_ms: int = 50) -> None:
+        self.root = root
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(
+            self,
+            fn: Callable,
+            *args,
+            on_done: Optional[Callable] = None,
+            on_error: Optional[Callable[[BaseException], None]] = None,
+            on_progress: Optional[Callable] = None
+    ) -> Future:
+        """
+        Run `fn(*args)` in the background.
+
+        :param on_done: Called on the Tk thread with the result.
+        :param on_error: Called on the Tk thread with the raised exception.
+        :param on_progress: If given, `fn` is also passed a `progress`
+            keyword callable; each new value it reports is handed to
+            `on_progress` on the Tk thread.
+        :return: Future: The running task.
+        """
+        progress = None
+        if on_progress is not None:
+            progress = Progress()
+            future = self._executor.submit(fn, *args, progress=progress)
+        else:
+            future = self._executor.submit(fn, *args)
+        self.root.after(self.poll_ms, self._watch, future, on_done, on_error,
+                        progress, on_progress)
+        return future
+
+    def _watch(self, future: Future, on_done, on_error, progress=None,
+               on_progress=None, last=None) -> None:
+        if progress is not None and progress.value != last:
+            last = progress.value
+            on_progress(last)
+        if not future.done():
+            self.root.after(self.poll_ms, self._watch, future, on_done,
+                            on_error, progress, on_progress, last)
+            return
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+        elif on_done is not None:
+            on_done(future.result())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
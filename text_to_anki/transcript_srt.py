@@ -1,59 +1,114 @@
+import io
+import os
 import re
-from datetime import datetime, timedelta
+from typing import IO, Iterable, Iterator, List, NamedTuple, Union
 
-def parse_transcript(transcript: str) -> list[tuple[str, str]]:
+# "MM:SS - text", also "HH:MM:SS - text" and fractions like "MM:SS.250"
+TIMESTAMP_LINE = re.compile(
+    r"(?:(\d+):)?(\d+):(\d{2})(?:[.,](\d{1,3}))? - (.+)")
+# How long the last cue of a run stays up
+DEFAULT_DURATION_MS = 2000
+
+
+class Cue(NamedTuple):
+    """One subtitle: start and end in milliseconds from the file start."""
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+def parse_timestamp(match: re.Match) -> int:
     """
-    Parse the transcript to extract timestamps and text.
+    Start time of a matched transcript line.
 
-    :param transcript: The input transcript string.
-    :return: A list of tuples containing start time, end time, and text.
+    :param match: A TIMESTAMP_LINE match.
+    :return: The time in milliseconds.
+    """
+    hours, minutes, seconds, fraction = match.group(1, 2, 3, 4)
+    ms = (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)) * 1000
+    if fraction:
+        ms += int(fraction.ljust(3, "0"))
+    return ms
+
+def iter_cues(lines: Iterable[str]) -> Iterator[Cue]:
     """
-    lines = transcript.strip().split('\n')
-    parsed_lines = []
-    for i in range(len(lines)):
-        # Match the format "00:15 - text"
-        match = re.match(r"(\d{2}:\d{2}) - (.+)", lines[i])
+    Parse transcript lines into cues in a single pass.
+
+    A cue ends where the line right after it starts; when that line has no
+    timestamp (or there is none) it lasts DEFAULT_DURATION_MS.
+
+    :param lines: The transcript, line by line.
+    :return: The cues in order.
+    """
+    pending = None  # (start_ms, text) of the previous line, if it matched
+    for line in lines:
+        match = TIMESTAMP_LINE.match(line)
+        # Each timestamp is parsed once, as this start and the last end
+        line_ms = parse_timestamp(match) if match else None
+        if pending is not None:
+            start_ms, text = pending
+            end_ms = (line_ms if match
+                      else start_ms + DEFAULT_DURATION_MS)
+            yield Cue(start_ms, end_ms, text)
+            pending = None
         if match:
-            start_time = match.group(1)
-            text = match.group(2)
-            end_time = calculate_end_time(start_time, i, lines)
-            parsed_lines.append((start_time, end_time, text))
-    return parsed_lines
+            pending = (line_ms, match.group(5))
+    if pending is not None:
+        start_ms, text = pending
+        yield Cue(start_ms, start_ms + DEFAULT_DURATION_MS, text)
 
-def calculate_end_time(start_time: str, index: int, lines: list[str]) -> str:
+def parse_transcript(transcript: str) -> List[Cue]:
     """
-    Calculate the end time for a subtitle.
+    Parse the transcript to extract timestamps and text.
 
-    :param start_time: The start time of the current subtitle.
-    :param index: The index of the current subtitle.
-    :param lines: The list of all transcript lines.
-    :return: The end time for the current subtitle.
+    :param transcript: The input transcript string.
+    :return: A list of cues with start time, end time, and text.
     """
-    next_start_time = None
-    if index + 1 < len(lines):
-        next_match = re.match(r"(\d{2}:\d{2}) - .+", lines[index + 1])
-        if next_match:
-            next_start_time = next_match.group(1)
-    
-    if next_start_time:
-        end_time = next_start_time
-    else:
-        # If it's the last subtitle, assume it lasts for 2 seconds.
-        start_dt = datetime.strptime(start_time, "%M:%S")
-        end_dt = start_dt + timedelta(seconds=2)
-        end_time = end_dt.strftime("%M:%S")
-    
-    return end_time
+    return list(iter_cues(transcript.strip().split('\n')))
 
-def format_time_srt(time_str: str) -> str:
+def format_ms_srt(ms: int) -> str:
     """
-    Format the time string to SRT format.
+    Format a time in milliseconds to SRT format.
 
-    :param time_str: The input time string in "MM:SS" format.
+    :param ms: The time in milliseconds.
     :return: The formatted time string in "HH:MM:SS,mmm" format.
     """
-    dt = datetime.strptime(time_str, "%M:%S")
-    return dt.strftime("00:%M:%S,000")
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+def write_srt(cues: Iterable[Cue], file: IO[str]) -> int:
+    """
+    Stream cues to a file object in SRT format.
+
+    :param cues: The cues in playback order.
+    :param file: A text file object to write to.
+    :return: The number of cues written.
+    """
+    count = 0
+    last_ms, last_time = None, None
+    for count, cue in enumerate(cues, 1):
+        # Consecutive cues usually share a boundary; format it only once
+        start_time = (last_time if cue.start_ms == last_ms
+                      else format_ms_srt(cue.start_ms))
+        last_ms, last_time = cue.end_ms, format_ms_srt(cue.end_ms)
+        # Cues are separated by a blank line; none follows the last one
+        separator = "\n" if count > 1 else ""
+        file.write(f"{separator}{count}\n{start_time} --> {last_time}\n"
+                   f"{cue.text}\n")
+    return count
+
+def cues_to_srt(cues: Iterable[Cue]) -> str:
+    """
+    Convert timestamped cues, e.g. from the transcriber, to SRT format.
+
+    :param cues: The cues in playback order.
+    :return: The formatted SRT string.
+    """
+    buffer = io.StringIO()
+    write_srt(cues, buffer)
+    return buffer.getvalue()
 
 def convert_to_srt(transcript: str) -> str:
     """
@@ -62,19 +117,41 @@ def convert_to_srt(transcript: str) -> str:
     :param transcript: The input transcript string.
     :return: The formatted SRT string.
     """
-    parsed_lines = parse_transcript(transcript)
-    srt_lines = []
-    for i, (start_time, end_time, text) in enumerate(parsed_lines):
-        srt_lines.append(f"{i + 1}")
-        srt_lines.append(f"{format_time_srt(start_time)} --> {format_time_srt(end_time)}")
-        srt_lines.append(text)
-        srt_lines.append("")
-    return "\n".join(srt_lines)
+    return cues_to_srt(iter_cues(transcript.strip().split('\n')))
 
-def main(transcript):
-    # Example usage
-    srt_output = convert_to_srt(transcript)
-    with open("output.srt", "w", encoding="utf-8") as file:
+def save_srt(transcript: Union[str, Iterable[Cue]],
+             destination: Union[str, os.PathLike, IO[str]]) -> int:
+    """
+    Stream a transcript to `destination` as SRT without building the whole
+    text in memory. Safe to run off the GUI thread.
+
+    :param transcript: A "MM:SS - text" transcript or an iterable of Cues.
+    :param destination: A path to (over)write, or an open text stream.
+    :return: The number of cues written.
+    """
+    if isinstance(transcript, str):
+        cues = iter_cues(transcript.strip().split('\n'))
+    else:
+        cues = transcript
+    if hasattr(destination, "write"):
+        return write_srt(cues, destination)
+    with open(destination, "w", encoding="utf-8") as file:
+        return write_srt(cues, file)
+
+def main(transcript: Union[str, Iterable[Cue]],
+         destination: Union[str, os.PathLike, IO[str]] = "output.srt"):
+    """
+    Write SRT from either a "MM:SS - text" transcript or a list of Cues to
+    `destination` (a path or stream), and return the SRT text.
+    """
+    if isinstance(transcript, str):
+        srt_output = convert_to_srt(transcript)
+    else:
+        srt_output = cues_to_srt(transcript)
+    if hasattr(destination, "write"):
+        destination.write(srt_output)
+        return srt_output
+    with open(destination, "w", encoding="utf-8") as file:
         file.write(srt_output)
 
     return srt_output
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from threading import Lock
+from typing import Optional
+
+base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+default_cache = os.path.join(base_path, 'data', 'cache', 'transcriptions.db')
+
+
+class TranscriptionCache:
+    """
+    Persistent cache of transcriptions, keyed by a hash of the segment's
+    PCM together with the model and prompt used.
+
+    Entries are evicted least recently used first once their total size
+    passes `max_bytes`. Safe to share between transcription threads.
+
+    :param path: str: SQLite database file; created if missing.
+    :param max_bytes: int: Size cap for the stored transcriptions.
+    """
+
+    def __init__(self, path: str = default_cache,
+                 max_bytes: int = 64 * 1024 * 1024) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transcriptions ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS transcriptions_last_used"
+            " ON transcriptions (last_used)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(audio_segment, model: str, prompt: str,
+            response_format: str = "json") -> str:
+        """
+        Content address of a segment's transcription.
+
+        :param audio_segment: AudioSegment: The audio to be transcribed.
+        :param model: str: Transcription model name.
+        :param prompt: str: Prompt sent with the audio.
+        :param response_format: str: Requested response format; entries for
+            plain text and timestamped responses are kept apart.
+        :return: str: Hex digest identifying the request.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{audio_segment.frame_rate}:"
+                      f"{audio_segment.sample_width}:"
+                      f"{audio_segment.channels}:".encode())
+        digest.update(audio_segment.raw_data)
+        digest.update(b"\0" + model.encode("utf-8"))
+        digest.update(b"\0" + prompt.encode("utf-8"))
+        # Left out for plain text so existing entries keep their keys
+        if response_format != "json":
+            digest.update(b"\0" + response_format.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM transcriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE transcriptions SET last_used = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcriptions VALUES (?, ?, ?, ?)",
+                (key, text, len(text.encode("utf-8")), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcriptions"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._db.execute(
+                "SELECT key, size FROM transcriptions ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM transcriptions WHERE key = ?",
+                             stale)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+from typing import Dict, List
+
+base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+jobs_path = os.path.join(base_path, 'data', 'jobs')
+
+
+class TranscriptionIncomplete(RuntimeError):
+    """Raised when some segments still failed after all retries."""
+
+    def __init__(self, failures: Dict[int, BaseException],
+                 manifest: str = None) -> None:
+        self.failures = failures
+        self.manifest = manifest
+        message = (f"{len(failures)} segment(s) failed: "
+                   f"{sorted(failures)}")
+        if manifest is not None:
+            message += f"; finished segments are saved in {manifest}"
+        super().__init__(message)
+
+
+class TranscriptionJob:
+    """
+    Manifest of one file's transcription, checkpointed to `data/jobs/`
+    after every finished segment so an interrupted run can pick up where
+    it stopped.
+
+    The job id is derived from the source file (path, size, modification
+    time) and every option that changes the segmentation or the request,
+    so the same call after a crash or restart finds the same manifest.
+
+    :param file_path: str: The audio file being transcribed.
+    :param options: Dict: Segmentation and request options.
+    :param directory: str: Where manifests are kept.
+    """
+
+    def __init__(self, file_path: str, options: Dict,
+                 directory: str = jobs_path) -> None:
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        identity = json.dumps([file_path, stat.st_size, stat.st_mtime_ns,
+                               options], sort_keys=True)
+        self.job_id = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(directory, f"{self.job_id}.json")
+        self.source = file_path
+        self.options = options
+        self.complete = False
+        self.segment_count = None
+        self.segments: Dict[int, Dict] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as manifest:
+                saved = json.load(manifest)
+            self.complete = saved["complete"]
+            self.segment_count = saved["segment_count"]
+            self.segments = {int(index): segment for index, segment
+                             in saved["segments"].items()}
+
+    def record(self, index: int, start_ms: int, text) -> None:
+        """Checkpoint one finished segment."""
+        self.segments[index] = {"start_ms": start_ms, "text": text}
+        self.save()
+
+    def finish(self, segment_count: int) -> None:
+        self.segment_count = segment_count
+        self.complete = len(self.segments) == segment_count
+        self.save()
+
+    def results(self) -> List:
+        return [self.segments[index]["text"]
+                for index in range(self.segment_count)]
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest:
+            json.dump({
+                "source": self.source,
+                "options": self.options,
+                "complete": self.complete,
+                "segment_count": self.segment_count,
+                "segments": self.segments,
+            }, manifest, ensure_ascii=False, indent=4)
+        # Replace in one step so a crash never leaves a half-written file
+        os.replace(temp_path, self.path)
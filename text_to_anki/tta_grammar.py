@@ -1,9 +1,16 @@
 import json
-import nltk
 import os
+import re
 
-from typing import List, Dict, Set
+from threading import Event, Lock
+from typing import (Callable, Dict, FrozenSet, Iterable, Iterator, List,
+                    Optional, Tuple)
 from collections import Counter
+from functools import partial
+
+from lexicon_store import (CompiledLexicon, SqliteLexicon, COMPILED_NAME,
+                           SQLITE_NAME)
+from tta_tokenize import get_tokenizer
 
 FILTER_KNOWN = True
 
@@ -16,10 +23,19 @@ class Language:
         std_path: str = os.path.join(data_path, 'lex', 'forward_map.json')
         self.standard: str = std_path if os.path.exists(std_path) else None
 
+        self.compiled_path: str = os.path.join(data_path, 'lex', COMPILED_NAME)
+        self.compiled: str = self.compiled_path if os.path.exists(
+            self.compiled_path) else None
+
+        self.sqlite_path: str = os.path.join(data_path, 'lex', SQLITE_NAME)
+        self.sqlite: str = self.sqlite_path if os.path.exists(
+            self.sqlite_path) else None
+
         rev_path: str = os.path.join(data_path, 'lex', 'backward_map.json')
         if os.path.exists(rev_path):
             self.reverse: str = rev_path
-        elif self.standard is not None:
+        elif (self.standard is not None and self.compiled is None
+              and self.sqlite is None):
             raise NotImplementedError("Reverse json generator from "
                                       "SloDictGen Project not yet implemented")
         else:
@@ -28,6 +44,21 @@ class Language:
         exclusion_path: str = os.path.join(data_path, 'lex', 'exclusion_list.csv')
         self.exclusion_list: str = exclusion_path if os.path.exists(exclusion_path) else None
 
+        # Optional per-pack options, e.g. {"tokenizer": "punkt",
+        # "tokenizer_options": {"language": "slovene"},
+        # "lexicon_backend": "sqlite"}
+        pack_path: str = os.path.join(data_path, 'pack.json')
+        pack: Dict = {}
+        if os.path.exists(pack_path):
+            with open(pack_path, "r", encoding="utf-8") as pack_file:
+                pack = json.load(pack_file)
+        self.tokenizer: str = pack.get("tokenizer", "regex")
+        self.tokenizer_options: Dict = pack.get("tokenizer_options", {})
+        self.lexicon_backend: str = pack.get("lexicon_backend", "compiled")
+
+    def make_tokenizer(self):
+        return get_tokenizer(self.tokenizer, **self.tokenizer_options)
+
 class Lexicon:
     """Class of lemmas and their wordform lists."""
 
@@ -36,35 +67,222 @@ class Lexicon:
             lang: str,
             settings: Dict
     ) -> None:
-        language = Language(lang)
+        self.language = Language(lang)
+        self._data = None
+        self.filtering: bool = bool(settings.get("exclusion_list_filtering"))
+        self._memo: Dict[str, FrozenSet[str]] = {}
+        self._known_ids = None
+        self.all_known: FrozenSet[str] = self._read_known()
+
+    def _read_known(self) -> FrozenSet[str]:
+        """Read the exclusion list once into a frozen set of lemmas."""
+        if not self.filtering or self.language.exclusion_list is None:
+            return frozenset()
+        with open(self.language.exclusion_list, "r",
+                  encoding="utf-8-sig") as known_file:
+            return frozenset(line.split(',')[0].strip()
+                             for line in known_file)
 
+    def reload_exclusion_list(self) -> None:
+        """Re-read the exclusion list and drop every memoized lookup."""
+        self.all_known = self._read_known()
+        self._known_ids = None
+        self._memo.clear()
 
+    def apply_settings(self, settings: Dict) -> None:
+        """Pick up a changed `exclusion_list_filtering` setting."""
+        filtering = bool(settings.get("exclusion_list_filtering"))
+        if filtering != self.filtering:
+            self.filtering = filtering
+            self.reload_exclusion_list()
 
-        """Initialize the lexicon with data loaded from a JSON file."""
+    @property
+    def data(self):
+        """Form -> lemmas map, loaded on first access."""
+        if self._data is None:
+            self._data = self._load_data()
+        return self._data
+
+    def _load_data(self):
+        """
+        Memory-map the compiled lexicon when one exists, otherwise fall back
+        to parsing backward_map.json. Packs with "lexicon_backend": "sqlite"
+        (or only a lexicon.db) are queried from SQLite instead.
+        """
+        language = self.language
+        if language.sqlite is not None and (
+                language.lexicon_backend == "sqlite"
+                or language.compiled is None):
+            return SqliteLexicon(language.sqlite)
+        if language.compiled is not None:
+            return CompiledLexicon(language.compiled)
         if language.standard is not None:
             with open(language.reverse, "r", encoding="utf-8") as reverse:
                 form_lemmas: Dict[str, List[str]] = json.load(reverse)
-                self.data: Dict[str, List[str]] = form_lemmas
+            return form_lemmas
+        return {}
+
+    def prefetch(self, words: Iterable[str]) -> None:
+        """Resolve all unseen `words` in one query on the SQLite backend."""
+        data = self.data
+        if isinstance(data, SqliteLexicon):
+            data.lookup_many(words)
+
+    def _known_bitmap(self, data) -> bytearray:
+        """Bitmap over lemma ids, set for every lemma on the exclusion list."""
+        if self._known_ids is None:
+            bitmap = bytearray((data.lemma_count + 7) // 8)
+            if isinstance(data, SqliteLexicon):
+                known_ids = data.lemma_ids_of(self.all_known)
+            else:
+                known_ids = (data.lemma_id(lemma) for lemma in self.all_known)
+            for lemma_id in known_ids:
+                if lemma_id >= 0:
+                    bitmap[lemma_id >> 3] |= 1 << (lemma_id & 7)
+            self._known_ids = bitmap
+        return self._known_ids
+
+    def find_lemmas(self, word: str) -> FrozenSet[str]:
+        if isinstance(self.data, SqliteLexicon):
+            # Its bounded LRU already caches lookups; a memo here would
+            # grow with every distinct token.
+            return self._filter_lemmas(word)
+        found = self._memo.get(word)
+        if found is None:
+            found = self._memo[word] = self._filter_lemmas(word)
+        return found
+
+    def _filter_lemmas(self, word: str) -> FrozenSet[str]:
+        data = self.data
+        if isinstance(data, (CompiledLexicon, SqliteLexicon)):
+            ids = data.lemma_ids(word)
+            known = self._known_bitmap(data)
+            unknown_lemmas = frozenset(
+                data.lemma_name(i) for i in ids
+                if not known[i >> 3] & (1 << (i & 7)))
+            lemmas = ids
         else:
-            self.data = {}
+            lemmas = data.get(word, [])
+            unknown_lemmas = frozenset(lemmas) - self.all_known
+
+        return unknown_lemmas if unknown_lemmas else frozenset() if lemmas \
+            else frozenset({f'*{word}'})
+
+
+class StreamingTextAnalyzer:
+    """
+    Class for analyzing text fed in chunks, sentence by sentence.
+
+    Frequencies are updated as each complete sentence arrives; only the
+    trailing unfinished sentence is kept between chunks, so memory stays
+    bounded by the chunk size rather than the size of the whole text.
+    """
+
+    def __init__(self, lex: Lexicon, max_buffer: int = 1 << 20,
+                 tokenizer=None) -> None:
+        self.lex = lex
+        self.max_buffer = max_buffer
+        self.tokenizer = tokenizer or lex.language.make_tokenizer()
+        self.token_frequencies: Counter = Counter()
+        self.lemma_frequencies: Counter = Counter()
+        self._buffer: str = ''
+        self._continuing: bool = False
 
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[str],
+                    lex: Lexicon) -> 'StreamingTextAnalyzer':
+        analyzer = cls(lex)
+        for chunk in chunks:
+            analyzer.feed(chunk)
+        analyzer.close()
+        return analyzer
 
+    @classmethod
+    def from_file(cls, path: str, lex: Lexicon,
+                  chunk_size: int = 1 << 16) -> 'StreamingTextAnalyzer':
+        with open(path, "r", encoding="utf-8") as file:
+            return cls.from_chunks(iter(lambda: file.read(chunk_size), ''),
+                                   lex)
 
-        if settings.get("exclusion_list_filtering") and (language.exclusion_list is not None):
-            with open(language.exclusion_list, "r", encoding="utf-8") as known_file:
-                self.all_known: List[str] = [line.split(',')[0].strip() for
-                                             line in
-                                             known_file]
+    def feed(self, chunk: str) -> None:
+        """Count every sentence completed by `chunk`."""
+        self._buffer += chunk
+        sentences, cut = self.tokenizer.split(self._buffer)
+        if len(self._buffer) - cut > self.max_buffer:
+            # No sentence boundary in sight; flush up to the last word break
+            # and treat what follows as the same sentence. A trailing word
+            # with no break after it stays buffered so it is not split.
+            word_cut = max(self._buffer.rfind(' '), self._buffer.rfind('\n'))
+            flushed = []
+            if word_cut > cut:
+                flushed = self.tokenizer.tokenize(
+                    self._buffer[cut:word_cut + 1])
+                sentences.extend(flushed)
+                cut = word_cut + 1
+            self._count(sentences)
+            if flushed:
+                self._continuing = True
         else:
-            self.all_known: List[str] = []
+            self._count(sentences)
+        self._buffer = self._buffer[cut:]
 
+    def close(self) -> None:
+        """Count whatever is left in the buffer as the final sentence(s)."""
+        self._count(self.tokenizer.tokenize(self._buffer))
+        self._buffer = ''
+        self._continuing = False
+
+    def _count(self, sentences: List[List[str]]) -> None:
+        if not sentences:
+            return
+        counts: Counter = Counter()
+        for tokens in sentences:
+            if tokens and not self._continuing:
+                tokens[0] = tokens[0].lower()
+            self._continuing = False
+            counts.update(tokens)
+        self.token_frequencies.update(counts)
+
+        words = {token: token.lower() for token in counts
+                 if not any(char.isdigit() for char in token)}
+        self.lex.prefetch(words.values())
+
+        lemma_frequencies = self.lemma_frequencies
+        for token, word in words.items():
+            count = counts[token]
+            for lemma in self.lex.find_lemmas(word):
+                lemma_frequencies[lemma] += count
 
-    def find_lemmas(self, word: str) -> Set[str]:
-        lemmas = self.data.get(word, [])
-        unknown_lemmas = set(lemmas) - set(self.all_known)
 
-        return unknown_lemmas if unknown_lemmas else set() if lemmas else {
-            f'*{word}'}
+class AnalysisCancelled(Exception):
+    """Raised when an analysis is cancelled before it finishes."""
+
+
+def analyze_text(
+        text: str,
+        lex: Lexicon,
+        chunk_size: int = 1 << 16,
+        progress: Optional[Callable[[float], None]] = None,
+        cancel: Optional[Event] = None,
+        tokenizer=None
+) -> StreamingTextAnalyzer:
+    """
+    Analyze `text` in chunks so the work can be watched and interrupted.
+
+    :param progress: Called with the fraction of `text` processed so far.
+    :param cancel: Checked between chunks; once set, `AnalysisCancelled`
+        is raised.
+    :param tokenizer: Reused instead of building one from the lexicon.
+    """
+    analyzer = StreamingTextAnalyzer(lex, tokenizer=tokenizer)
+    for start in range(0, len(text), chunk_size):
+        if cancel is not None and cancel.is_set():
+            raise AnalysisCancelled()
+        analyzer.feed(text[start:start + chunk_size])
+        if progress is not None:
+            progress(min(start + chunk_size, len(text)) / len(text))
+    analyzer.close()
+    return analyzer
 
 
 class TextAnalyzer:
@@ -72,26 +290,220 @@ class TextAnalyzer:
 
     def __init__(self, input_text: str, lex: Lexicon) -> None:
         self.text: str = input_text
-        self.tokens: List[str] = self.tokenize()
-        self.token_frequencies = Counter(self.tokens)
-        self.lemmas = self.get_lemmas(lex)
-        self.lemma_frequencies = Counter(self.lemmas)
-
-    def tokenize(self) -> List[str]:
-        sentences = nltk.sent_tokenize(self.text)
-        decapitalized_tokens = []
-        for sentence in sentences:
-            tokens = nltk.RegexpTokenizer(r'\w+').tokenize(sentence)
-            if tokens:
-                tokens[0] = tokens[0].lower()
-            decapitalized_tokens.extend(tokens)
-        return decapitalized_tokens
+        analyzer = StreamingTextAnalyzer.from_chunks([input_text], lex)
+        self.token_frequencies = analyzer.token_frequencies
+        self.lemma_frequencies = analyzer.lemma_frequencies
+
+
+def _scaled_progress(progress: Callable[[float], None], start: int,
+                     size: int, total: int, fraction: float) -> None:
+    # Map one paragraph's progress onto the whole update
+    progress((start + fraction * size) / total)
+
+
+class IncrementalAnalyzer:
+    """
+    Class for keeping the frequencies of an edited document up to date.
+
+    The document is split into paragraphs at blank lines and at line breaks
+    that follow a sentence end, so a transcript with one sentence per line
+    is split line by line. Each update only analyzes paragraphs it has not
+    seen before, and the counts of removed paragraphs are subtracted. With
+    the regex tokenizer every cut falls on a sentence end, so the totals
+    equal a full `TextAnalyzer` run.
+    """
+
+    paragraph_break = re.compile(r'\n[^\S\n]*\n|(?<=[.!?…])[^\S\n]*\n')
+
+    def __init__(self, lex: Lexicon) -> None:
+        self.lex = lex
+        self.tokenizer = lex.language.make_tokenizer()
+        self.token_frequencies: Counter = Counter()
+        self.lemma_frequencies: Counter = Counter()
+        self._paragraphs: Counter = Counter()
+        self._cache: Dict[str, Tuple[Counter, Counter]] = {}
+        self._lock = Lock()
+
+    def _analyze(
+            self,
+            paragraph: str,
+            progress: Optional[Callable[[float], None]] = None,
+            cancel: Optional[Event] = None
+    ) -> Tuple[Counter, Counter]:
+        analyzer = analyze_text(paragraph, self.lex, progress=progress,
+                                cancel=cancel, tokenizer=self.tokenizer)
+        return analyzer.token_frequencies, analyzer.lemma_frequencies
+
+    def update(
+            self,
+            text: str,
+            progress: Optional[Callable[[float], None]] = None,
+            cancel: Optional[Event] = None
+    ) -> None:
+        """
+        Bring the frequencies in line with `text`.
+
+        :param progress: Called with the fraction of new text analyzed.
+        :param cancel: Checked between chunks of each paragraph; once set,
+            `AnalysisCancelled` is raised and the counts are left unchanged.
+        """
+        with self._lock:
+            paragraphs = Counter(self.paragraph_break.split(text))
+            added = paragraphs - self._paragraphs
+            removed = self._paragraphs - paragraphs
+
+            # Drop what a cancelled update analyzed but never applied,
+            # unless this text still needs it.
+            self._cache = {paragraph: counts
+                           for paragraph, counts in self._cache.items()
+                           if paragraph in self._paragraphs
+                           or paragraph in paragraphs}
+
+            new = [paragraph for paragraph in added
+                   if paragraph not in self._cache]
+            total = sum(len(paragraph) for paragraph in new) or 1
+            done = 0
+            for paragraph in new:
+                report = partial(_scaled_progress, progress, done,
+                                 len(paragraph), total) \
+                    if progress is not None else None
+                self._cache[paragraph] = self._analyze(paragraph, report,
+                                                       cancel)
+                done += len(paragraph)
+
+            for paragraph, count in removed.items():
+                tokens, lemmas = self._cache[paragraph]
+                for _ in range(count):
+                    self.token_frequencies -= tokens
+                    self.lemma_frequencies -= lemmas
+                if paragraph not in paragraphs:
+                    del self._cache[paragraph]
+            for paragraph, count in added.items():
+                tokens, lemmas = self._cache[paragraph]
+                for _ in range(count):
+                    self.token_frequencies.update(tokens)
+                    self.lemma_frequencies.update(lemmas)
+            self._paragraphs = paragraphs
 
-    def get_lemmas(self, lex) -> list:
-        lemmas = []
-        for token in self.tokens:
-            if any(char.isdigit() for char in token):
+    def snapshot(self, lemmas: bool = True) -> Counter:
+        """Return a copy of the lemma (or token) frequencies."""
+        with self._lock:
+            return Counter(self.lemma_frequencies if lemmas
+                           else self.token_frequencies)
+
+
+def shard_text(text: str, shard_size: int, tokenizer,
+               window: int = 4096) -> Iterator[str]:
+    """
+    Split `text` into pieces of roughly `shard_size` characters, cutting only
+    where the sentence tokenizer places a sentence boundary. Only a small
+    window around each cut is sentence-split, so sharding stays cheap.
+    """
+    start = 0
+    target = shard_size
+    while len(text) - start > shard_size and target < len(text):
+        low = max(start, target - window)
+        starts = [low + offset for offset in
+                  tokenizer.boundaries(text[low:target + window])
+                  if low + offset > start]
+        if starts:
+            cut = min(starts, key=lambda pos: abs(pos - target))
+            yield text[start:cut]
+            start = cut
+            target = cut + shard_size
+        else:
+            target += window
+    yield text[start:]
+
+
+def shard_file(path: str, shard_size: int, tokenizer) -> Iterator[str]:
+    """
+    Like `shard_text`, but reads the file `shard_size` characters at a time,
+    so only a couple of shards are held in memory at once.
+    """
+    buffer = ''
+    with open(path, "r", encoding="utf-8") as file:
+        for chunk in iter(lambda: file.read(shard_size), ''):
+            buffer += chunk
+            if len(buffer) < 2 * shard_size:
                 continue
-            found_lemmas = lex.find_lemmas(token.lower())
-            lemmas.extend(found_lemmas)
-        return lemmas
+            shards = list(shard_text(buffer, shard_size, tokenizer))
+            # The last piece may end mid-sentence; it waits for more text.
+            buffer = shards.pop()
+            yield from shards
+    yield from shard_text(buffer, shard_size, tokenizer)
+
+
+_worker_lexicon: Optional[Lexicon] = None
+
+
+def _init_worker(lang: str, settings: Dict) -> None:
+    # Each worker opens the lexicon itself; a compiled lexicon is
+    # memory-mapped, so all workers share the same read-only pages.
+    global _worker_lexicon
+    _worker_lexicon = Lexicon(lang, settings)
+
+
+def _analyze_shard(shard: Tuple[str, str]) -> Tuple[Counter, Counter]:
+    kind, value = shard
+    if kind == 'path':
+        analyzer = StreamingTextAnalyzer.from_file(value, _worker_lexicon)
+    else:
+        analyzer = StreamingTextAnalyzer.from_chunks([value], _worker_lexicon)
+    return analyzer.token_frequencies, analyzer.lemma_frequencies
+
+
+class ParallelTextAnalyzer:
+    """
+    Class for analyzing large texts or directories of texts across a
+    process pool.
+
+    Texts are cut into sentence-aligned shards and each worker returns the
+    Counters for its shard; merged, they equal what `TextAnalyzer` gives for
+    the same text (or, for a directory, the sum over its files).
+    """
+
+    def __init__(
+            self,
+            lang: str,
+            settings: Dict,
+            processes: Optional[int] = None,
+            shard_size: int = 1 << 20
+    ) -> None:
+        self.lang = lang
+        self.settings = settings
+        self.processes = processes
+        self.shard_size = shard_size
+        self.tokenizer = Language(lang).make_tokenizer()
+        self.token_frequencies: Counter = Counter()
+        self.lemma_frequencies: Counter = Counter()
+
+    def analyze_text(self, text: str) -> None:
+        self._run(('text', shard) for shard in
+                  shard_text(text, self.shard_size, self.tokenizer))
+
+    def analyze_paths(self, paths: Iterable[str]) -> None:
+        """Analyze files, or every file inside any directory given."""
+        self._run(self._path_shards(paths))
+
+    def _path_shards(self, paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        for path in paths:
+            if os.path.isdir(path):
+                yield from self._path_shards(sorted(
+                    entry.path for entry in os.scandir(path)
+                    if entry.is_file() or entry.is_dir()))
+            elif os.path.getsize(path) > self.shard_size:
+                for shard in shard_file(path, self.shard_size,
+                                        self.tokenizer):
+                    yield 'text', shard
+            else:
+                yield 'path', path
+
+    def _run(self, shards: Iterable[Tuple[str, str]]) -> None:
+        from multiprocessing import Pool
+
+        with Pool(self.processes, initializer=_init_worker,
+                  initargs=(self.lang, self.settings)) as pool:
+            for tokens, lemmas in pool.imap(_analyze_shard, shards):
+                self.token_frequencies.update(tokens)
+                self.lemma_frequencies.update(lemmas)
@@ -0,0 +1,117 @@
+import re
+
+from typing import Dict, List, Tuple, Type
+
+WORD = re.compile(r'\w+')
+
+
+class RegexTokenizer:
+    """
+    Fast tokenizer: one precompiled pattern finds words and sentence ends
+    in a single pass over the text.
+
+    A sentence ends at a run of terminal punctuation or a blank line.
+    """
+
+    pattern = re.compile(r'(\w+)|[.!?…]+|\n[^\S\n]*\n')
+    sentence_end = re.compile(r'[.!?…]+|\n[^\S\n]*\n')
+
+    def _sentences(self, text: str) -> Tuple[List[List[str]], List[str]]:
+        # findall yields each word, or '' for a sentence end.
+        sentences = []
+        tokens = []
+        for word in self.pattern.findall(text):
+            if word:
+                tokens.append(word)
+            elif tokens:
+                sentences.append(tokens)
+                tokens = []
+        return sentences, tokens
+
+    def _last_end(self, text: str) -> int:
+        # Scan backwards in growing steps; the unfinished tail is short.
+        size = 256
+        while True:
+            start = max(0, len(text) - size)
+            cut = -1
+            for match in self.sentence_end.finditer(text, start):
+                cut = match.end()
+            if cut >= 0 or start == 0:
+                return max(cut, 0)
+            size *= 4
+
+    def split(self, text: str) -> Tuple[List[List[str]], int]:
+        """
+        Tokenize the complete sentences in `text`.
+
+        :return: The token list of each complete sentence, and the offset
+            where the unfinished trailing sentence begins.
+        """
+        sentences, tail = self._sentences(text)
+        if not tail:
+            return sentences, len(text)
+        return sentences, self._last_end(text)
+
+    def tokenize(self, text: str) -> List[List[str]]:
+        """Tokenize all of `text`, its end closing the last sentence."""
+        sentences, tail = self._sentences(text)
+        if tail:
+            sentences.append(tail)
+        return sentences
+
+    def boundaries(self, text: str) -> List[int]:
+        """Return every offset in `text` where a new sentence begins."""
+        return [match.end() for match in self.sentence_end.finditer(text)]
+
+
+class PunktTokenizer:
+    """
+    Accurate tokenizer: NLTK's Punkt model splits sentences, then words are
+    matched with the same pattern as the fast path.
+
+    :param language: str: Name of the Punkt model to load.
+    """
+
+    def __init__(self, language: str = 'english') -> None:
+        self.language = language
+
+    def _sentences(self, text: str) -> List[str]:
+        import nltk
+        return nltk.sent_tokenize(text, language=self.language)
+
+    def split(self, text: str) -> Tuple[List[List[str]], int]:
+        sentences = self._sentences(text)
+        if not sentences:
+            return [], len(text)
+        # Punkt cannot tell whether the last sentence is finished, so it is
+        # held back until more text (or the end of the text) arrives.
+        tail = sentences.pop()
+        return ([WORD.findall(sentence) for sentence in sentences],
+                text.rindex(tail))
+
+    def tokenize(self, text: str) -> List[List[str]]:
+        return [WORD.findall(sentence) for sentence in self._sentences(text)]
+
+    def boundaries(self, text: str) -> List[int]:
+        starts = []
+        pos = 0
+        for sentence in self._sentences(text):
+            pos = text.index(sentence, pos)
+            starts.append(pos)
+            pos += len(sentence)
+        return starts[1:]
+
+
+TOKENIZERS: Dict[str, Type] = {
+    'regex': RegexTokenizer,
+    'punkt': PunktTokenizer,
+}
+
+
+def get_tokenizer(name: str = 'regex', **options):
+    """Build the tokenizer engine registered under `name`."""
+    try:
+        tokenizer = TOKENIZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer: {name}") from None
+    return tokenizer(**options)
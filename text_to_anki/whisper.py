@@ -1,10 +1,201 @@
 from tkinter import filedialog, Tk
-from typing import List, Dict
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
 from pydub import AudioSegment
-from openai import OpenAI
+from openai import (OpenAI, APIConnectionError, APITimeoutError,
+                    InternalServerError, RateLimitError)
+
+import numpy as np
+
+from transcription_cache import TranscriptionCache
+from transcription_job import TranscriptionJob, TranscriptionIncomplete
+from transcript_srt import Cue
 
 import json
 import os
+import subprocess
+import time
+
+MODEL = "whisper-1"
+# Request failures worth retrying; anything else (bad key, bad file, bugs)
+# is raised at once
+TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError,
+                    InternalServerError)
+# ffmpeg raw sample formats by AudioSegment.sample_width
+PCM_FORMATS = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+# Container format ffmpeg should assume, by file extension. Anything not
+# listed is left for ffmpeg to probe.
+SUPPORTED_FORMATS = {
+    'mp3': 'mp3',
+    'm4a': 'mp4',
+    'mp4': 'mp4',
+    'm4b': 'mp4',
+    'aac': 'aac',
+    'wav': 'wav',
+    'flac': 'flac',
+    'ogg': 'ogg',
+    'oga': 'ogg',
+    'opus': 'ogg',
+    'webm': 'webm',
+    'mkv': 'matroska',
+    'mka': 'matroska',
+    'wma': 'asf',
+    'aif': 'aiff',
+    'aiff': 'aiff',
+    'amr': 'amr',
+}
+# Streamed audio is decoded to what Whisper works on internally
+STREAM_FRAME_RATE = 16000
+STREAM_SAMPLE_WIDTH = 2
+# Energy is measured over windows of this length when looking for a quiet
+# place to cut
+SILENCE_WINDOW_MS = 50
+
+
+def window_rms(samples: np.ndarray, window: int) -> np.ndarray:
+    """
+    RMS level of each consecutive `window`-sample block, computed in one
+    vectorized pass.
+
+    :param samples: np.ndarray: Mono samples.
+    :param window: int: Block length in samples.
+    :return: np.ndarray: One RMS value per complete block.
+    """
+    blocks = len(samples) // window
+    frames = samples[:blocks * window].reshape(blocks, window)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+
+
+def quiet_cut(
+        samples: np.ndarray,
+        target: int,
+        tolerance: int,
+        window: int,
+        threshold: float
+) -> int:
+    """
+    Picks a cut point near `target`, snapped to the nearest quiet window.
+
+    :param samples: np.ndarray: Mono samples.
+    :param target: int: Preferred cut, as a sample index.
+    :param tolerance: int: How far (in samples) the cut may move.
+    :param window: int: Energy window length in samples.
+    :param threshold: float: RMS at or below which a window counts as quiet.
+    :return: int: Sample index to cut at. Falls back to the quietest window
+        in range when none is under `threshold`.
+    """
+    low = max(0, target - tolerance)
+    rms = window_rms(samples[low:target + tolerance], window)
+    if not len(rms):
+        return target
+    centers = low + np.arange(len(rms)) * window + window // 2
+    quiet = np.flatnonzero(rms <= threshold)
+    if len(quiet):
+        best = quiet[np.argmin(np.abs(centers[quiet] - target))]
+    else:
+        best = np.argmin(rms)
+    return int(centers[best])
+
+
+def stream_segments(
+        file_path: str,
+        segment_length: float,
+        silence_tolerance: float = 0,
+        silence_thresh: float = -40
+) -> Iterator[Tuple[int, AudioSegment]]:
+    """
+    Decodes an audio file through an ffmpeg pipe and yields it in segments,
+    so only about one segment's PCM is held at a time.
+
+    :param file_path: str: The path to the audio file.
+    :param segment_length: float: Length of each segment in minutes.
+    :param silence_tolerance: float: Seconds each cut may move to land in a
+        pause; 0 cuts at exact `segment_length` boundaries.
+    :param silence_thresh: float: dBFS at or below which audio counts as
+        silence.
+    :return: Iterator of (start in ms, segment) pairs.
+    """
+    command = [AudioSegment.converter, '-loglevel', 'error', '-nostdin']
+    file_format = SUPPORTED_FORMATS.get(file_path.rsplit('.', 1)[-1].lower())
+    if file_format is not None:
+        command += ['-f', file_format]
+    command += [
+        '-i', file_path,
+        '-f', PCM_FORMATS[STREAM_SAMPLE_WIDTH],
+        '-ac', '1', '-ar', str(STREAM_FRAME_RATE),
+        'pipe:1'
+    ]
+    segment_samples = int(segment_length * 60 * STREAM_FRAME_RATE)
+    tolerance = min(int(silence_tolerance * STREAM_FRAME_RATE),
+                    segment_samples // 2)
+    window = STREAM_FRAME_RATE * SILENCE_WINDOW_MS // 1000
+    threshold = 2 ** (8 * STREAM_SAMPLE_WIDTH - 1) * 10 ** (silence_thresh / 20)
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    try:
+        start = 0  # in samples
+        buffer = b''
+        # Read past the boundary by the tolerance so a later quiet spot can
+        # be chosen; the remainder is carried into the next segment.
+        wanted = (segment_samples + tolerance) * STREAM_SAMPLE_WIDTH
+        while True:
+            data = process.stdout.read(wanted - len(buffer))
+            buffer += data
+            if not buffer:
+                break
+            if len(buffer) < wanted:
+                cut = len(buffer)  # end of the file
+            elif tolerance:
+                samples = np.frombuffer(buffer, dtype=np.int16)
+                cut = quiet_cut(samples, segment_samples, tolerance, window,
+                                threshold) * STREAM_SAMPLE_WIDTH
+            else:
+                cut = len(buffer)
+            segment = AudioSegment(data=buffer[:cut],
+                                   sample_width=STREAM_SAMPLE_WIDTH,
+                                   frame_rate=STREAM_FRAME_RATE, channels=1)
+            buffer = buffer[cut:]
+            yield start * 1000 // STREAM_FRAME_RATE, segment
+            start += cut // STREAM_SAMPLE_WIDTH
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg could not decode {file_path}: "
+                               f"{process.stderr.read().decode().strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def offset_cues(cues: List[Cue], start_ms: int) -> List[Cue]:
+    """Shifts cues timed from a segment's start to the file's timeline."""
+    return [Cue(cue.start_ms + start_ms, cue.end_ms + start_ms, cue.text)
+            for cue in cues]
+
+
+def encode_mp3(audio_segment: AudioSegment) -> bytes:
+    """
+    Encodes a segment to mp3 entirely in memory by piping its raw PCM
+    through ffmpeg (pydub's own export goes via temp files).
+
+    :param audio_segment: AudioSegment: The audio to encode.
+    :return: bytes: The mp3 data.
+    """
+    command = [
+        AudioSegment.converter, '-loglevel', 'error',
+        '-f', PCM_FORMATS[audio_segment.sample_width],
+        '-ar', str(audio_segment.frame_rate),
+        '-ac', str(audio_segment.channels),
+        '-i', 'pipe:0',
+        '-f', 'mp3', 'pipe:1'
+    ]
+    result = subprocess.run(command, input=audio_segment.raw_data,
+                            capture_output=True, check=True)
+    return result.stdout
 
 
 class AudioTranscriber:
@@ -12,11 +203,43 @@ class AudioTranscriber:
     A class to handle audio file loading, segmenting, and transcribing using OpenAI's Whisper model.
 
     :param api_key: str: The API key for OpenAI services.
+    :param base_url: str: Alternative API endpoint, e.g. a local stub server.
+    :param max_workers: int: Segments kept in flight at once.
+    :param max_retries: int: Extra attempts per segment after a failure.
+    :param backoff: float: Seconds to wait before the first retry; doubled
+        on every further retry.
+    :param cache: TranscriptionCache: Earlier results to reuse; segments
+        found here are not sent again.
+    :param timestamps: bool: Ask for segment timestamps; results are then
+        lists of Cues instead of plain text.
+    :param executor: Executor: Pool to send segments through. Passing one
+        shared pool to several transcribers caps their requests together;
+        by default each call makes its own pool of `max_workers`.
     """
-    def __init__(self, api_key: str, prompt='') -> None:
+    def __init__(
+            self,
+            api_key: str,
+            prompt='',
+            base_url: str = None,
+            max_workers: int = 4,
+            max_retries: int = 3,
+            backoff: float = 1.0,
+            cache: TranscriptionCache = None,
+            timestamps: bool = False,
+            executor: Executor = None
+    ) -> None:
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key)
+        # Retries are handled per segment below
+        self.client = OpenAI(api_key=api_key, base_url=base_url,
+                             max_retries=0)
         self.prompt = prompt
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.timestamps = timestamps
+        self.response_format = "verbose_json" if timestamps else "json"
+        self.executor = executor
 
     def load_audio_file(self, file_path: str) -> None:
         """
@@ -25,27 +248,55 @@ class AudioTranscriber:
         :param file_path: str: The path to the audio file.
         """
         # Determine the file format based on the file extension
-        file_extension = file_path.split('.')[-1]
-        supported_formats = {
-            'mp3': 'mp3',
-            'm4a': 'mp4',
-            'wav': 'wav'
-        }
-        format = supported_formats.get(file_extension, 'mp3')  # Default to 'mp3' if unknown
+        file_extension = file_path.split('.')[-1].lower()
+        format = SUPPORTED_FORMATS.get(file_extension)  # ffmpeg probes unknown ones
         self.audio_file = AudioSegment.from_file(file_path, format=format)
 
-    def segment_audio(self, segment_length: int) -> list:
+    def segment_audio(
+            self,
+            segment_length: int,
+            silence_tolerance: float = 0,
+            silence_thresh: float = -40
+    ) -> list:
         """
         Segments the audio file into chunks of the specified length in minutes.
         Handles files shorter than the segment length.
 
         :param segment_length: int: Length of each segment in minutes.
+        :param silence_tolerance: float: Seconds each cut may move to land in
+            a pause; 0 cuts at exact `segment_length` boundaries.
+        :param silence_thresh: float: dBFS at or below which audio counts as
+            silence.
         :return: list: List of audio segments.
         """
         segment_length_ms = segment_length * 60 * 1000
         if len(self.audio_file) < segment_length_ms:
             return [self.audio_file]  # Return the whole file as one segment if it's shorter than the segment length
-        return [self.audio_file[i:i + segment_length_ms] for i in range(0, len(self.audio_file), segment_length_ms)]
+        if not silence_tolerance:
+            return [self.audio_file[i:i + segment_length_ms] for i in range(0, len(self.audio_file), segment_length_ms)]
+
+        audio = self.audio_file
+        rate = audio.frame_rate
+        samples = np.array(audio.get_array_of_samples()).reshape(
+            -1, audio.channels).mean(axis=1)
+        step = int(segment_length * 60 * rate)
+        tolerance = min(int(silence_tolerance * rate), step // 2)
+        window = rate * SILENCE_WINDOW_MS // 1000
+        threshold = audio.max_possible_amplitude * 10 ** (silence_thresh / 20)
+
+        cuts = [0]
+        while len(samples) - cuts[-1] > step + tolerance:
+            cuts.append(quiet_cut(samples, cuts[-1] + step, tolerance,
+                                  window, threshold))
+        cuts.append(len(samples))
+        return [audio.get_sample_slice(start, end)
+                for start, end in zip(cuts, cuts[1:])]
+
+    def _restore(self, result):
+        """Rebuild Cues from a result that went through JSON."""
+        if not self.timestamps:
+            return result
+        return [Cue(*cue) for cue in result]
 
     def transcribe_audio(self, audio_segment: AudioSegment) -> str:
         """
@@ -54,24 +305,174 @@ class AudioTranscriber:
         :param audio_segment: AudioSegment: The audio segment to transcribe.
         :return: str: The transcription of the audio segment.
         """
-        audio_segment.export("temp_audio.mp3", format="mp3")  # Export to a common format
-        with open("temp_audio.mp3", "rb") as file:
+        return self.transcribe_bytes(encode_mp3(audio_segment))
+
+    def transcribe_bytes(self, data: bytes):
+        """
+        Transcribes already encoded mp3 data.
+
+        :param data: bytes: The mp3 data.
+        :return: str: The transcription, or with `timestamps` a list of
+            Cues timed from the start of this audio.
+        """
+        if not self.timestamps:
             transcription = self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=file,
+                model=MODEL,
+                file=("segment.mp3", data),
                 prompt=self.prompt
             )
             return transcription.text
+        transcription = self.client.audio.transcriptions.create(
+            model=MODEL,
+            file=("segment.mp3", data),
+            prompt=self.prompt,
+            response_format=self.response_format,
+            timestamp_granularities=["segment"]
+        )
+        return [Cue(round(segment.start * 1000), round(segment.end * 1000),
+                    segment.text.strip())
+                for segment in transcription.segments or []]
+
+    def transcribe_with_retry(self, audio_segment: AudioSegment) -> str:
+        """
+        Transcribes a single audio segment, retrying connection, timeout,
+        rate limit and server errors with exponential backoff. The segment is only encoded once, and not at
+        all if the cache already holds its transcription.
+
+        :param audio_segment: AudioSegment: The audio segment to transcribe.
+        :return: str: The transcription of the audio segment.
+        """
+        key = None
+        if self.cache is not None:
+            key = TranscriptionCache.key(audio_segment, MODEL, self.prompt,
+                                         self.response_format)
+            cached = self.cache.get(key)
+            if cached is not None:
+                if self.timestamps:
+                    return self._restore(json.loads(cached))
+                return cached
+
+        data = encode_mp3(audio_segment)
+        for attempt in range(self.max_retries + 1):
+            try:
+                text = self.transcribe_bytes(data)
+                break
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+        if key is not None:
+            self.cache.put(key, json.dumps(text, ensure_ascii=False)
+                           if self.timestamps else text)
+        return text
+
+    @contextmanager
+    def _segment_pool(self) -> Iterator[Executor]:
+        if self.executor is not None:
+            yield self.executor
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield executor
 
     def transcribe(self, segment_length: int) -> list:
         """
-        Segments and transcribes the entire audio file.
+        Segments and transcribes the entire audio file, with up to
+        `max_workers` segments in flight.
 
         :param segment_length: int: Length of each segment in minutes.
-        :return: list: List of transcriptions for each segment.
+        :return: list: List of transcriptions for each segment, in order.
         """
         segments = self.segment_audio(segment_length)
-        return [self.transcribe_audio(segment) for segment in segments]
+        with self._segment_pool() as executor:
+            transcriptions = list(
+                executor.map(self.transcribe_with_retry, segments))
+        if self.timestamps:
+            start_ms = 0
+            for index, segment in enumerate(segments):
+                transcriptions[index] = offset_cues(transcriptions[index],
+                                                    start_ms)
+                start_ms += len(segment)
+        return transcriptions
+
+    def transcribe_file(
+            self,
+            file_path: str,
+            segment_length: float,
+            silence_tolerance: float = 10,
+            job: TranscriptionJob = None,
+            progress: Optional[Callable[[int], None]] = None
+    ) -> list:
+        """
+        Streams, segments and transcribes an audio file without loading it
+        whole. At most `max_workers` segments are decoded and in flight at
+        once, so memory stays flat however long the recording is.
+
+        A failed segment does not stop the others; once every segment has
+        been tried, `TranscriptionIncomplete` is raised naming the ones
+        that failed.
+
+        :param file_path: str: The path to the audio file.
+        :param segment_length: float: Length of each segment in minutes.
+        :param silence_tolerance: float: Seconds each cut may move to land
+            in a pause rather than mid-word.
+        :param job: TranscriptionJob: Manifest to checkpoint finished
+            segments to. Segments it already holds are not sent again, so
+            rerunning an interrupted job only transcribes what is missing.
+        :param progress: Called with the number of segments finished so far
+            each time one completes.
+        :return: list: List of transcriptions for each segment, in order.
+            With `timestamps` each is a list of Cues timed from the start
+            of the file.
+        """
+        if job is not None and job.complete:
+            return [self._restore(result) for result in job.results()]
+
+        transcriptions = {}
+        failures = {}
+        pending = deque()
+
+        def collect():
+            index, start_ms, future = pending.popleft()
+            try:
+                transcriptions[index] = future.result()
+            except Exception as error:
+                failures[index] = error
+                return
+            if self.timestamps:
+                transcriptions[index] = offset_cues(transcriptions[index],
+                                                    start_ms)
+            if job is not None:
+                job.record(index, start_ms, transcriptions[index])
+            if progress is not None:
+                progress(len(transcriptions))
+
+        segment_count = 0
+        with self._segment_pool() as executor:
+            for index, (start_ms, segment) in enumerate(stream_segments(
+                    file_path, segment_length, silence_tolerance)):
+                segment_count = index + 1
+                # Segments still have to be decoded to find the later cut
+                # points, but finished ones are not sent again
+                if job is not None and index in job.segments:
+                    transcriptions[index] = self._restore(
+                        job.segments[index]["text"])
+                    if progress is not None:
+                        progress(len(transcriptions))
+                    continue
+                if len(pending) >= self.max_workers:
+                    collect()
+                pending.append((index, start_ms, executor.submit(
+                    self.transcribe_with_retry, segment)))
+            while pending:
+                collect()
+
+        if job is not None:
+            job.finish(segment_count)
+        if failures:
+            raise TranscriptionIncomplete(
+                failures, job.path if job is not None else None)
+        return [transcriptions[index] for index in range(segment_count)]
 
 
 def select_file():
@@ -84,28 +485,69 @@ def select_file():
     return file_path
 
 
-def main(
-        prompt: str = '',
-        file_path: str = None,
-        segment_length: int = 15
-):
+def load_user() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Reads the API key and optional endpoint from `data/users/user.json`.
+
+    :return: (api key, base url); either may be None.
+    """
     base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     data_path = os.path.join(base_path, 'data')
     user_path = os.path.join(data_path, "users", "user.json")
     with open(user_path, "r", encoding="utf-8") as user_data:
         user: Dict = json.load(user_data)
-        user_api = user.get("api", None)
+    return user.get("api", None), user.get("base_url", None)
+
+
+def make_job(
+        file_path: str,
+        segment_length: float,
+        silence_tolerance: float,
+        prompt: str,
+        timestamps: bool = False
+) -> TranscriptionJob:
+    """Job manifest for these options; rerunning the same file resumes it."""
+    return TranscriptionJob(file_path, {
+        "segment_length": segment_length,
+        "silence_tolerance": silence_tolerance,
+        "model": MODEL,
+        "prompt": prompt,
+        "timestamps": timestamps,
+    })
+
+
+def main(
+        prompt: str = '',
+        file_path: str = None,
+        segment_length: int = 15,
+        base_url: str = None,
+        timestamps: bool = False
+):
+    """
+    Transcribes an audio file, asking for one if `file_path` is not given.
+
+    :return: List of transcriptions per segment, or with `timestamps` one
+        list of Cues for the whole file.
+    """
+    user_api, user_base_url = load_user()
+    base_url = base_url or user_base_url
     if user_api is None:
         return "OpenAI API key needed for this action"
-    transcriber = AudioTranscriber(user_api, prompt)
+    transcriber = AudioTranscriber(user_api, prompt, base_url=base_url,
+                                   cache=TranscriptionCache(),
+                                   timestamps=timestamps)
     if file_path is None:
         file_path = select_file()
     if file_path:
-        transcriber.load_audio_file(file_path)
-        transcriptions: List[str] = transcriber.transcribe(segment_length)
+        silence_tolerance = 10
+        job = make_job(file_path, segment_length, silence_tolerance, prompt,
+                       timestamps)
+        transcriptions: List = transcriber.transcribe_file(
+            file_path, segment_length, silence_tolerance, job=job)
+        if timestamps:
+            return [cue for cues in transcriptions for cue in cues]
         return transcriptions
 
-
 if __name__ == "__main__":
     kps = '''
         Dobro jutro, dragi poslušalci. Danes bomo raziskali povezavo med umom in telesom.